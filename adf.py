@@ -0,0 +1,88 @@
+"""
+Atlassian Document Format (ADF) and Confluence storage format helpers
+"""
+
+from html.parser import HTMLParser
+
+# Storage-format elements that end a line of text
+BLOCK_TAGS = frozenset((
+    'p', 'div', 'br', 'li', 'tr', 'td', 'th', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'pre', 'blockquote', 'table', 'ul', 'ol', 'ac:task', 'ac:layout-cell'
+))
+# Elements whose content is markup or configuration rather than page text
+SKIP_TAGS = frozenset(('ac:parameter', 'ri:attachment', 'ri:user', 'style', 'script'))
+
+def extract_text_from_adf(adf_doc):
+    """Extract plain text from Atlassian Document Format
+
+    Single pass over an explicit stack of child iterators, so deeply nested
+    tables and lists cannot hit the recursion limit.
+    """
+    if not adf_doc or not isinstance(adf_doc, dict):
+        return ""
+    
+    text_parts = []
+    append = text_parts.append
+    stack = [iter((adf_doc,))]
+    push = stack.append
+    
+    while stack:
+        for node in stack[-1]:
+            # Decoded JSON only holds plain dicts and lists, so exact type checks are safe
+            if type(node) is dict:
+                # Extract text content
+                if node.get('type') == 'text':
+                    append(node.get('text', ''))
+                
+                # Descend into the content array, resuming this level afterwards
+                content = node.get('content')
+                if type(content) is list:
+                    push(iter(content))
+                    break
+            elif type(node) is list:
+                push(iter(node))
+                break
+        else:
+            stack.pop()
+    
+    return ' '.join(text_parts)
+
+class StorageTextParser(HTMLParser):
+    """Incremental Confluence storage-format (XHTML) to plain text converter
+
+    Feed it chunks as they arrive; text() joins what has been seen so far.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._parts = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip += 1
+        elif tag in BLOCK_TAGS:
+            self._parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in BLOCK_TAGS:
+            self._parts.append('\n')
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._parts.append(data)
+
+    def text(self):
+        lines = (' '.join(line.split()) for line in ''.join(self._parts).split('\n'))
+        return '\n'.join(line for line in lines if line)
+
+def storage_to_text(storage):
+    """Plain text of a Confluence storage-format body"""
+    if not storage:
+        return ''
+    parser = StorageTextParser()
+    parser.feed(storage)
+    parser.close()
+    return parser.text()
@@ -0,0 +1,106 @@
+"""
+Micro-benchmark for ADF text extraction on large synthetic Jira descriptions
+
+    python benchmarks/bench_adf.py [--repeat 20]
+
+Compares the iterative walker in adf.py with the previous recursive closure,
+and the cost of a memoized lookup for an unchanged issue.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adf import extract_text_from_adf
+from search_cache import MemoryCache
+
+def extract_text_recursive(adf_doc):
+    """The original recursive implementation, kept here as the baseline"""
+    if not adf_doc or not isinstance(adf_doc, dict):
+        return ""
+    text_parts = []
+    def traverse(node):
+        if isinstance(node, dict):
+            if node.get('type') == 'text':
+                text_parts.append(node.get('text', ''))
+            if 'content' in node and isinstance(node['content'], list):
+                for child in node['content']:
+                    traverse(child)
+        elif isinstance(node, list):
+            for item in node:
+                traverse(item)
+    traverse(adf_doc)
+    return ' '.join(text_parts)
+
+def text(value):
+    return {'type': 'text', 'text': value}
+
+def paragraph(i, words=12):
+    return {'type': 'paragraph', 'content': [text(f"step {i} word {w}") for w in range(words)]}
+
+def wide_document(paragraphs):
+    """A long description: many paragraphs, bullet lists and a table"""
+    content = []
+    for i in range(paragraphs):
+        content.append(paragraph(i))
+        if i % 10 == 0:
+            content.append({'type': 'bulletList', 'content': [
+                {'type': 'listItem', 'content': [paragraph(f"{i}.{j}", 4)]} for j in range(5)
+            ]})
+        if i % 50 == 0:
+            content.append({'type': 'table', 'content': [
+                {'type': 'tableRow', 'content': [
+                    {'type': 'tableCell', 'content': [paragraph(f"{i}:{r}:{c}", 3)]} for c in range(6)
+                ]} for r in range(8)
+            ]})
+    return {'type': 'doc', 'version': 1, 'content': content}
+
+def deep_document(depth):
+    """Nested lists `depth` levels deep - beyond ~300 levels the recursive walker overflows"""
+    node = paragraph('leaf', 3)
+    for level in range(depth):
+        node = {'type': 'bulletList', 'content': [
+            {'type': 'listItem', 'content': [paragraph(level, 2), node]}
+        ]}
+    return {'type': 'doc', 'version': 1, 'content': [node]}
+
+def timed(func, doc, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(doc)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'document':<28}{'words':>10}{'recursive ms':>15}{'iterative ms':>15}{'speedup':>10}")
+    cases = [(f"wide x{n}", wide_document(n)) for n in (100, 1000, 5000)]
+    cases += [(f"deep x{d}", deep_document(d)) for d in (200, 2000)]
+    for name, doc in cases:
+        words = len(extract_text_from_adf(doc).split(' '))
+        iterative = timed(extract_text_from_adf, doc, args.repeat)
+        try:
+            recursive = timed(extract_text_recursive, doc, args.repeat)
+            recursive_ms = f"{recursive * 1000:.2f}"
+            speedup = f"{recursive / iterative:.2f}x"
+        except RecursionError:
+            recursive_ms, speedup = 'RecursionError', '-'
+        print(f"{name:<28}{words:>10}{recursive_ms:>15}{iterative * 1000:>15.2f}{speedup:>10}")
+
+    # Memoized path: an unchanged issue (same key + updated) is never flattened twice
+    cache = MemoryCache(ttl=3600)
+    doc = wide_document(5000)
+    key = 'https://example.atlassian.net|CD-1|2024-01-01T00:00:00.000+0000'
+    cache.set(key, extract_text_from_adf(doc))
+    hit = timed(lambda _: cache.get(key), None, args.repeat)
+    print(f"\nmemoized lookup for wide x5000: {hit * 1000:.3f} ms")
+
+if __name__ == '__main__':
+    main()
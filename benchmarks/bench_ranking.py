@@ -0,0 +1,79 @@
+"""
+Ranking throughput benchmark: BM25 ranker vs the previous fixed-score substring ranking
+
+    python benchmarks/bench_ranking.py [--repeat 5]
+
+Scores synthetic Jira issues (short summary, long description) at several result-set
+sizes and reports documents scored per second.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ranking import BM25Ranker, TopK
+
+VOCABULARY = [f"word{i}" for i in range(2000)] + ['shopping', 'list', 'asset', 'attached', 'login', 'template']
+
+def synthetic_issues(count, seed=42):
+    rng = random.Random(seed)
+    issues = []
+    for i in range(count):
+        summary = ' '.join(rng.choices(VOCABULARY, k=rng.randint(4, 12)))
+        description = ' '.join(rng.choices(VOCABULARY, k=rng.randint(50, 400)))
+        issues.append({'key': f"CD-{i}", 'fields': {'summary': summary, 'description_text': description}})
+    return issues
+
+def legacy_rank(query, issues, k=25):
+    """The fixed 100/90/70/50/30 scoring that BM25 replaced"""
+    query_lower = query.lower()
+    ranked = TopK(k)
+    for issue in issues:
+        summary = (issue['fields'].get('summary') or '').lower()
+        description = issue['fields']['description_text'].lower()
+        if query_lower == summary:
+            score = 100
+        elif query_lower in summary:
+            score = 90
+        elif description and query_lower in description:
+            score = 70
+        elif all(word in summary or word in description for word in query_lower.split()):
+            score = 50
+        else:
+            score = 30
+        ranked.push(score, issue)
+    return ranked.items()
+
+def bm25_rank(query, issues, k=25):
+    ranker = BM25Ranker(query, k)
+    for issue in issues:
+        ranker.add(issue, {'title': issue['fields']['summary'], 'body': issue['fields']['description_text']})
+    return ranker.top(k)
+
+def best_time(func, query, issues, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(query, issues)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--query', default='shopping list')
+    args = parser.parse_args()
+
+    print(f"{'results':>8}{'legacy ms':>12}{'legacy docs/s':>16}{'bm25 ms':>12}{'bm25 docs/s':>16}")
+    for size in (50, 500, 5000, 20000):
+        issues = synthetic_issues(size)
+        legacy = best_time(legacy_rank, args.query, issues, args.repeat)
+        bm25 = best_time(bm25_rank, args.query, issues, args.repeat)
+        print(f"{size:>8}{legacy * 1000:>12.2f}{size / legacy:>16,.0f}{bm25 * 1000:>12.2f}{size / bm25:>16,.0f}")
+
+if __name__ == '__main__':
+    main()
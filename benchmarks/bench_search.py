@@ -0,0 +1,143 @@
+"""
+End-to-end /search load benchmark against the local Atlassian stand-in
+
+    python benchmarks/bench_search.py [--concurrency 1,8,32] [--results 50,200] [--requests 200]
+                                      [--latency 50] [--jira-endpoint jql] [--rate-limit 0] [--url URL]
+
+Starts benchmarks/mock_atlassian.py and the app (Werkzeug, threaded) as subprocesses, or
+benchmarks a running server given with --url (e.g. under gunicorn, pointed at the mock).
+For each concurrency level and result size it sends --requests searches with distinct
+queries and Cache-Control: no-store, and reports p50/p95/p99 latency and requests per second.
+"""
+
+import argparse
+import itertools
+import math
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APP_SERVER = (
+    "import sys; sys.path.insert(0, {root!r}); from wsgi import app; "
+    "from werkzeug.serving import run_simple; run_simple('127.0.0.1', {port}, app, threaded=True)"
+)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def run_level(url, mock_url, concurrency, results, total_requests, counter):
+    local = threading.local()
+
+    def one(_):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        body = {
+            'email': 'bench@example.com', 'token': 'bench', 'baseUrl': mock_url,
+            'query': f"shopping list {next(counter)}", 'maxResults': results
+        }
+        started = time.perf_counter()
+        try:
+            response = session.post(f"{url}/search", json=body, headers={'Cache-Control': 'no-store'}, timeout=120)
+            ok = response.status_code == 200
+        except requests.exceptions.RequestException:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, range(total_requests)))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(seconds for seconds, _ in outcomes)
+    errors = sum(1 for _, ok in outcomes if not ok)
+    return latencies, errors, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concurrency', default='1,8,32', help='comma-separated concurrency levels')
+    parser.add_argument('--results', default='50,200', help='comma-separated maxResults per backend')
+    parser.add_argument('--requests', type=int, default=200, help='searches per concurrency level and result size')
+    parser.add_argument('--latency', type=float, default=50, help='mock latency per request in milliseconds')
+    parser.add_argument('--jitter', type=float, default=10, help='+/- milliseconds of mock latency')
+    parser.add_argument('--adf-paragraphs', type=int, default=20)
+    parser.add_argument('--jira-endpoint', choices=('search', 'jql'), default='search')
+    parser.add_argument('--rate-limit', type=float, default=0, help='mock requests per second before 429')
+    parser.add_argument('--url', help='benchmark this running app instead of starting one')
+    parser.add_argument('--mock-url', help='use this running mock instead of starting one')
+    args = parser.parse_args()
+
+    processes = []
+    try:
+        mock_url = args.mock_url
+        if not mock_url:
+            port = free_port()
+            processes.append(subprocess.Popen([
+                sys.executable, os.path.join(ROOT, 'benchmarks', 'mock_atlassian.py'), '--port', str(port),
+                '--latency', str(args.latency), '--jitter', str(args.jitter),
+                '--adf-paragraphs', str(args.adf_paragraphs), '--jira-endpoint', args.jira_endpoint,
+                '--rate-limit', str(args.rate_limit), '--issues', '1000', '--pages', '500'
+            ], stdout=subprocess.DEVNULL))
+            mock_url = f"http://127.0.0.1:{port}"
+            wait_until_up(f"{mock_url}/counts")
+
+        url = args.url
+        if not url:
+            port = free_port()
+            # The app's own per-tenant limit would otherwise cap the load at 10 requests/s
+            env = {'ATLASSIAN_RATE_LIMIT': '100000', 'ATLASSIAN_RATE_BURST': '100000',
+                   'ATLASSIAN_MAX_CONCURRENT': '1000', 'SEARCH_WORKERS': '128', **os.environ}
+            processes.append(subprocess.Popen(
+                [sys.executable, '-c', APP_SERVER.format(root=ROOT, port=port)],
+                cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            ))
+            url = f"http://127.0.0.1:{port}"
+            wait_until_up(f"{url}/cache/stats")
+
+        print(f"app {url}, mock {mock_url} ({args.latency:g}ms latency, {args.adf_paragraphs} ADF paragraphs, "
+              f"jira endpoint {args.jira_endpoint})")
+        print(f"{'concurrency':>12}{'results':>9}{'requests':>10}{'errors':>8}"
+              f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+        counter = itertools.count()
+        for results in (int(value) for value in args.results.split(',')):
+            for concurrency in (int(value) for value in args.concurrency.split(',')):
+                latencies, errors, elapsed = run_level(url, mock_url, concurrency, results, args.requests, counter)
+                print(f"{concurrency:>12}{results:>9}{len(latencies):>10}{errors:>8}"
+                      f"{percentile(latencies, 0.50) * 1000:>10.1f}{percentile(latencies, 0.95) * 1000:>10.1f}"
+                      f"{percentile(latencies, 0.99) * 1000:>10.1f}{len(latencies) / elapsed:>10.1f}")
+
+        counts = requests.get(f"{mock_url}/counts", timeout=5).json()
+        print(f"\nmock requests: {counts}")
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=10)
+
+if __name__ == '__main__':
+    main()
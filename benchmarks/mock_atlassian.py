@@ -0,0 +1,314 @@
+"""
+Local stand-in for the Atlassian search APIs, for benchmarks and offline testing
+
+    python benchmarks/mock_atlassian.py [--port 8765] [--latency 50] [--jira-endpoint jql] [--rate-limit 20]
+
+Serves synthetic issues with ADF-heavy descriptions on POST /rest/api/3/search
+(startAt paging) and POST /rest/api/3/search/jql (nextPageToken paging), single
+issues on GET /rest/api/3/issue/{key}, pages on GET /wiki/rest/api/search
+(_links.next cursors) and page bodies on GET /wiki/api/v2/pages?id=... and
+GET /wiki/rest/api/content/{id}. With --jira-endpoint jql the old /search answers 410 like
+a migrated tenant; --rate-limit answers 429 with Retry-After once the per-second
+budget is spent. Issues form a tree (each has a parent, sub-tasks and a "Blocks" link),
+and JQL of the form key in (...) OR parent in (...) is honoured; any other JQL matches
+every issue. Every request waits --latency ms (+/- --jitter) before answering.
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+KEY_CLAUSE = re.compile(r'\b(key|parent) in \(([^)]*)\)')
+# Each issue has this many sub-tasks in the synthetic issue tree
+CHILDREN = 4
+
+VOCABULARY = [f"word{i}" for i in range(500)] + [
+    'shopping', 'list', 'asset', 'attached', 'login', 'template', 'checkout', 'payment', 'profile', 'search'
+]
+
+def text_node(text, strong=False):
+    node = {'type': 'text', 'text': text}
+    if strong:
+        node['marks'] = [{'type': 'strong'}]
+    return node
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(VOCABULARY) for _ in range(words)).capitalize() + '.'
+
+def adf_description(rng, paragraphs):
+    """A description shaped like real tickets: paragraphs with marks, bullet lists and a table"""
+    content = []
+    for p in range(paragraphs):
+        content.append({'type': 'paragraph', 'content': [
+            text_node(sentence(rng, rng.randint(8, 20)) + ' '),
+            text_node(sentence(rng, rng.randint(3, 6)), strong=True),
+            text_node(' ' + sentence(rng, rng.randint(8, 20)))
+        ]})
+        if p % 5 == 4:
+            content.append({'type': 'bulletList', 'content': [
+                {'type': 'listItem', 'content': [{'type': 'paragraph', 'content': [text_node(sentence(rng, 6))]}]}
+                for _ in range(4)
+            ]})
+        if p % 10 == 9:
+            content.append({'type': 'table', 'content': [
+                {'type': 'tableRow', 'content': [
+                    {'type': 'tableCell', 'content': [{'type': 'paragraph', 'content': [text_node(sentence(rng, 3))]}]}
+                    for _ in range(4)
+                ]} for _ in range(4)
+            ]})
+    return {'type': 'doc', 'version': 1, 'content': content}
+
+class MockAtlassian:
+    """Synthetic tenant state shared by the request handlers"""
+
+    def __init__(self, total_issues=1000, total_pages=500, adf_paragraphs=20, latency=0.05, jitter=0.0,
+                 jira_endpoint='search', rate_limit=0.0):
+        self.total_issues = total_issues
+        self.total_pages = total_pages
+        self.adf_paragraphs = adf_paragraphs
+        self.latency = latency
+        self.jitter = jitter
+        self.jira_endpoint = jira_endpoint
+        self.rate_limit = rate_limit
+        self.counts = {}
+        self._tokens = rate_limit
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.issue = lru_cache(maxsize=None)(self._issue)
+
+    def number(self, key):
+        """Index of the issue with this key, or None"""
+        number = key.strip().rsplit('-', 1)[-1]
+        if number.isdigit() and 0 < int(number) <= self.total_issues:
+            return int(number) - 1
+        return None
+
+    def matching(self, jql):
+        """Indexes of the issues matching jql (only key in / parent in are understood)"""
+        clauses = KEY_CLAUSE.findall(jql or '')
+        if not clauses:
+            return range(self.total_issues)
+        found = []
+        for field, keys in clauses:
+            for key in keys.split(','):
+                i = self.number(key)
+                if i is not None:
+                    found.extend([i] if field == 'key' else self.children(i))
+        return sorted(set(found))
+
+    def children(self, i):
+        return [c for c in range(i * CHILDREN + 1, (i + 1) * CHILDREN + 1) if c < self.total_issues]
+
+    def _issue(self, i):
+        rng = random.Random(i)
+        blocked = (i * 7 + 3) % self.total_issues
+        return {
+            'id': str(10000 + i),
+            'key': f"MOCK-{i + 1}",
+            'fields': {
+                'summary': sentence(rng, rng.randint(4, 10)),
+                'description': adf_description(rng, self.adf_paragraphs),
+                'status': {'name': rng.choice(['To Do', 'In Progress', 'Done'])},
+                'issuetype': {'name': rng.choice(['Story', 'Bug', 'Task'])},
+                'priority': {'name': rng.choice(['High', 'Medium', 'Low'])},
+                'updated': '2024-01-01T00:00:00.000+0000',
+                'parent': {'key': f"MOCK-{(i - 1) // CHILDREN + 1}"} if i else None,
+                'subtasks': [{'key': f"MOCK-{c + 1}"} for c in self.children(i)],
+                'issuelinks': [{
+                    'type': {'name': 'Blocks', 'inward': 'is blocked by', 'outward': 'blocks'},
+                    'outwardIssue': {'key': f"MOCK-{blocked + 1}"}
+                }]
+            }
+        }
+
+    def page(self, i):
+        rng = random.Random(-1 - i)
+        title = sentence(rng, rng.randint(3, 7)).rstrip('.')
+        return {
+            'content': {
+                'id': str(20000 + i), 'type': 'page', 'title': title, 'version': {'number': 1},
+                '_links': {'webui': f"/pages/{20000 + i}"}
+            },
+            'excerpt': f"@@@hl@@@{title.split()[0]}@@@endhl@@@ {sentence(rng, 20)}"
+        }
+
+    def page_body(self, i):
+        """Storage-format body of page i: headings, paragraphs and a list"""
+        rng = random.Random(-100000 - i)
+        parts = []
+        for section in range(self.adf_paragraphs // 4 + 1):
+            parts.append(f"<h2>{sentence(rng, 3)}</h2>")
+            parts.extend(f"<p>{sentence(rng, rng.randint(8, 20))} <strong>{sentence(rng, 4)}</strong></p>" for _ in range(3))
+            parts.append('<ul>' + ''.join(f"<li>{sentence(rng, 6)}</li>" for _ in range(3)) + '</ul>')
+        return ''.join(parts)
+
+    def page_with_body(self, i):
+        return {
+            'id': str(20000 + i), 'title': self.page(i)['content']['title'], 'version': {'number': 1},
+            'body': {'storage': {'value': self.page_body(i), 'representation': 'storage'}}
+        }
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def take_token(self):
+        """Seconds until the next request is allowed, 0 if it may go now"""
+        if not self.rate_limit:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._updated) * self.rate_limit)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate_limit
+
+    def wait(self):
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+def make_handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def throttled(self):
+            retry = mock.take_token()
+            if not retry:
+                return False
+            mock.count('429')
+            self.send_json(429, {'message': 'Rate limit exceeded'}, {
+                'Retry-After': str(max(1, math.ceil(retry))),
+                'X-RateLimit-Remaining': '0'
+            })
+            return True
+
+        def do_POST(self):
+            path = urlparse(self.path).path
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+            mock.count(path)
+            mock.wait()
+            if self.throttled():
+                return
+            size = max(0, min(int(body.get('maxResults', 50)), 100))
+            if path == '/rest/api/3/search':
+                if mock.jira_endpoint == 'jql':
+                    return self.send_json(410, {'errorMessages': ['This endpoint has been removed']})
+                matching = mock.matching(body.get('jql'))
+                start = int(body.get('startAt', 0))
+                end = min(len(matching), start + size)
+                return self.send_json(200, {
+                    'startAt': start, 'maxResults': size, 'total': len(matching),
+                    'issues': [mock.issue(i) for i in matching[start:end]]
+                })
+            if path == '/rest/api/3/search/jql':
+                matching = mock.matching(body.get('jql'))
+                start = int(body.get('nextPageToken') or 0)
+                end = min(len(matching), start + size)
+                payload = {'issues': [mock.issue(i) for i in matching[start:end]], 'isLast': end >= len(matching)}
+                if end < len(matching):
+                    payload['nextPageToken'] = str(end)
+                return self.send_json(200, payload)
+            self.send_json(404, {'errorMessages': ['Not found']})
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path == '/counts':
+                with mock._lock:
+                    return self.send_json(200, dict(mock.counts))
+            # Single issues and pages are counted per endpoint, not per id
+            counted = url.path
+            if counted.startswith(('/rest/api/3/issue/', '/wiki/rest/api/content/')):
+                counted = counted.rsplit('/', 1)[0]
+            mock.count(counted)
+            mock.wait()
+            if self.throttled():
+                return
+            if url.path == '/wiki/rest/api/search':
+                start = int(query.get('cursor', ['0'])[0])
+                limit = max(0, min(int(query.get('limit', ['25'])[0]), 100))
+                end = min(mock.total_pages, start + limit)
+                payload = {
+                    'results': [mock.page(i) for i in range(start, end)],
+                    'start': start, 'limit': limit, 'size': end - start,
+                    '_links': {'base': f"http://{self.headers.get('Host')}/wiki"}
+                }
+                if end < mock.total_pages:
+                    payload['_links']['next'] = f"/rest/api/search?cursor={end}&limit={limit}"
+                return self.send_json(200, payload)
+            if url.path == '/wiki/api/v2/pages':
+                ids = [value for value in ','.join(query.get('id', [])).split(',') if value]
+                numbers = [int(value) - 20000 for value in ids if value.isdigit()]
+                return self.send_json(200, {'results': [
+                    mock.page_with_body(number) for number in numbers if 0 <= number < mock.total_pages
+                ], '_links': {}})
+            if url.path.startswith('/wiki/rest/api/content/'):
+                number = url.path.rsplit('/', 1)[1]
+                if number.isdigit() and 0 <= int(number) - 20000 < mock.total_pages:
+                    return self.send_json(200, mock.page_with_body(int(number) - 20000))
+                return self.send_json(404, {'message': 'No content found'})
+            if url.path.startswith('/rest/api/3/issue/'):
+                number = mock.number(url.path.rsplit('/', 1)[1])
+                if number is not None:
+                    return self.send_json(200, mock.issue(number))
+                return self.send_json(404, {'errorMessages': ['Issue does not exist']})
+            self.send_json(404, {'errorMessages': ['Not found']})
+
+    return Handler
+
+def serve(mock, host='127.0.0.1', port=8765):
+    server = ThreadingHTTPServer((host, port), make_handler(mock))
+    server.daemon_threads = True
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=50, help='milliseconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0, help='+/- milliseconds of random latency')
+    parser.add_argument('--issues', type=int, default=1000, help='issues matching every JQL query')
+    parser.add_argument('--pages', type=int, default=500, help='pages matching every CQL query')
+    parser.add_argument('--adf-paragraphs', type=int, default=20, help='paragraphs per issue description')
+    parser.add_argument('--jira-endpoint', choices=('search', 'jql'), default='search',
+                        help='jql makes /rest/api/3/search answer 410')
+    parser.add_argument('--rate-limit', type=float, default=0, help='requests per second before 429 (0 = unlimited)')
+    args = parser.parse_args()
+
+    mock = MockAtlassian(
+        total_issues=args.issues, total_pages=args.pages, adf_paragraphs=args.adf_paragraphs,
+        latency=args.latency / 1000, jitter=args.jitter / 1000,
+        jira_endpoint=args.jira_endpoint, rate_limit=args.rate_limit
+    )
+    server = serve(mock, args.host, args.port)
+    print(f"Mock Atlassian on http://{args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+gunicorn settings for serving the search tool in production
+
+    pip install gunicorn gevent
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gevent workers run every request (and the app's search thread pools) as greenlets, so
+each worker process holds hundreds of in-flight searches waiting on Atlassian on one OS
+thread. Set GUNICORN_WORKER_CLASS=gthread to use real threads instead.
+"""
+
+import multiprocessing
+import os
+import sys
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+workers = int(os.environ.get('WEB_CONCURRENCY', str(min(multiprocessing.cpu_count(), 4))))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+# Concurrent requests per gevent worker
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '1000'))
+# Threads per gthread worker
+threads = int(os.environ.get('GUNICORN_THREADS', '32'))
+# Searches wait up to 45s on Atlassian and batches stream for longer
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+# On SIGTERM, in-flight searches get this long to finish before workers are killed
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+accesslog = '-'
+
+if worker_class == 'gevent':
+    # Pool threads are greenlets here, so large pools cost little.
+    # Must be set before the app module reads them.
+    os.environ.setdefault('SEARCH_WORKERS', '256')
+    os.environ.setdefault('BATCH_WORKERS', '64')
+
+def worker_exit(server, worker):
+    """Cancel queued background work and close keep-alive sessions once a worker has drained"""
+    module = sys.modules.get('atlassian_search')
+    if module is not None:
+        module.shutdown()
@@ -0,0 +1,75 @@
+"""
+Per-tenant cache of which Jira search endpoint works
+Tenants where /rest/api/3/search is gone (410) go straight to /rest/api/3/search/jql
+"""
+
+import threading
+import time
+
+import requests
+
+from rate_limit import RateLimitedError
+
+SEARCH_ENDPOINT = '/rest/api/3/search'
+SEARCH_JQL_ENDPOINT = '/rest/api/3/search/jql'
+
+class JiraEndpointCache:
+    """Remembers the working Jira search endpoint per base URL for ttl seconds"""
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._endpoints = {}  # base_url -> (endpoint, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, base_url):
+        """Return the endpoint to try first for this tenant"""
+        with self._lock:
+            entry = self._endpoints.get(base_url)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        return SEARCH_ENDPOINT
+
+    def is_known(self, base_url):
+        with self._lock:
+            entry = self._endpoints.get(base_url)
+        return bool(entry and entry[1] > time.monotonic())
+
+    def remember(self, base_url, endpoint):
+        with self._lock:
+            self._endpoints[base_url] = (endpoint, time.monotonic() + self.ttl)
+
+    def forget(self, base_url=None):
+        """Drop the cached endpoint so the next search reprobes (all tenants if no base_url)"""
+        with self._lock:
+            if base_url is None:
+                self._endpoints.clear()
+            else:
+                self._endpoints.pop(base_url, None)
+
+    def probe(self, post, base_url, timeout=10):
+        """Find the working search endpoint with a zero-result query and cache it
+
+        post(url, **kwargs) sends the request - session.post, or one going through the
+        request scheduler. It must carry credentials: Jira answers an anonymous probe with 401.
+        """
+        try:
+            response = post(
+                f"{base_url}{SEARCH_ENDPOINT}",
+                json={'jql': 'order by created DESC', 'maxResults': 0},
+                headers={'Content-Type': 'application/json'},
+                timeout=timeout
+            )
+        except (requests.exceptions.RequestException, RateLimitedError) as e:
+            print(f"Jira endpoint probe failed for {base_url}: {e}")
+            return None
+        # 410 means the tenant only serves /search/jql, a 2xx that the old endpoint still works;
+        # anything else (e.g. 401/403 for a credential that cannot search) says nothing either way
+        if response.status_code == 410:
+            endpoint = SEARCH_JQL_ENDPOINT
+        elif 200 <= response.status_code < 300:
+            endpoint = SEARCH_ENDPOINT
+        else:
+            print(f"Jira endpoint probe for {base_url} inconclusive: HTTP {response.status_code}")
+            return None
+        self.remember(base_url, endpoint)
+        return endpoint
@@ -0,0 +1,300 @@
+"""
+Optional local full-text index of Jira issues and Confluence pages (SQLite FTS5)
+Kept current by a background incremental sync so /search can answer without an Atlassian round trip
+"""
+
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from adf import extract_text_from_adf, storage_to_text
+
+WORD = re.compile(r'\w+')
+TICKET_KEY = re.compile(r'^[A-Za-z][A-Za-z0-9_]*-\d+$')
+BATCH_SIZE = 200
+FTS_COLUMNS = {'issues_fts': 'summary, description', 'pages_fts': 'title, body'}
+
+class ScanTruncated(Exception):
+    """A sync scan stopped at its item limit with more results left"""
+
+def fts_query(query):
+    """Turn free text into an FTS5 query: every word must match, quoted so syntax is never interpreted"""
+    words = WORD.findall(query)
+    return ' '.join(f'"{word}"' for word in words)
+
+def issue_document(issue):
+    """Compact issue in the /search response shape, with the ADF description flattened"""
+    fields = issue.get('fields', {})
+    description = fields.get('description')
+    if isinstance(description, dict):
+        description = extract_text_from_adf(description)
+    elif not isinstance(description, str):
+        description = ''
+    named = {}
+    for name in ('status', 'issuetype', 'priority'):
+        value = fields.get(name)
+        named[name] = {'name': value.get('name')} if isinstance(value, dict) else None
+    return {
+        'key': issue.get('key'),
+        'fields': {
+            'summary': fields.get('summary') or '',
+            'description_text': description,
+            **named,
+            'updated': fields.get('updated')
+        }
+    }
+
+def page_document(item):
+    """Compact page (from a /wiki/rest/api/search result) plus its body text"""
+    content = item.get('content', item)
+    body = content.get('body', {}).get('storage', {}).get('value', '')
+    page = {'id': content.get('id'), 'title': content.get('title') or '', 'type': content.get('type')}
+    return page, storage_to_text(body)
+
+class LocalIndex:
+    """SQLite FTS5 index of issue summaries/descriptions and page titles/bodies"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_db()
+
+    def _connect(self):
+        # sqlite3 connections are bound to the thread that created them
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS issues (
+                rowid INTEGER PRIMARY KEY,
+                key TEXT NOT NULL UNIQUE,
+                doc TEXT NOT NULL,
+                synced_at REAL NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS issues_fts USING fts5(
+                summary, description, tokenize='porter unicode61'
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                rowid INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                doc TEXT NOT NULL,
+                synced_at REAL NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(
+                title, body, tokenize='porter unicode61'
+            );
+            CREATE TABLE IF NOT EXISTS sync_state (
+                name TEXT PRIMARY KEY,
+                value REAL NOT NULL
+            );
+        """)
+
+    def get_state(self, name):
+        row = self._connect().execute('SELECT value FROM sync_state WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, name, value):
+        self._connect().execute('INSERT OR REPLACE INTO sync_state (name, value) VALUES (?, ?)', (name, value))
+
+    def acquire_lease(self, name, seconds):
+        """Let one worker process at a time run the sync; returns True for the winner"""
+        conn = self._connect()
+        now = time.time()
+        conn.execute('INSERT OR IGNORE INTO sync_state (name, value) VALUES (?, 0)', (name,))
+        cursor = conn.execute(
+            'UPDATE sync_state SET value = ? WHERE name = ? AND value < ?', (now + seconds, name, now)
+        )
+        return cursor.rowcount == 1
+
+    def upsert_issues(self, issues, synced_at):
+        """Index raw Jira issues in batches; returns how many were written"""
+        return self._upsert(
+            ((doc['key'], doc, doc['fields']['summary'], doc['fields']['description_text'])
+             for doc in map(issue_document, issues)),
+            'issues', 'issues_fts', 'key', synced_at
+        )
+
+    def upsert_pages(self, items, synced_at):
+        """Index Confluence search results (with body.storage expanded) in batches"""
+        return self._upsert(
+            ((page['id'], page, page['title'], body) for page, body in map(page_document, items)),
+            'pages', 'pages_fts', 'id', synced_at
+        )
+
+    def _upsert(self, rows, table, fts_table, id_column, synced_at):
+        conn = self._connect()
+        written = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                written += self._write_batch(conn, batch, table, fts_table, id_column, synced_at)
+                batch = []
+        if batch:
+            written += self._write_batch(conn, batch, table, fts_table, id_column, synced_at)
+        return written
+
+    def _write_batch(self, conn, batch, table, fts_table, id_column, synced_at):
+        # The FTS row shares the rowid of its document row, so replacing one is two indexed deletes
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for item_id, doc, title, text in batch:
+                payload = json.dumps(doc, separators=(',', ':'))
+                row = conn.execute(f'SELECT rowid FROM {table} WHERE {id_column} = ?', (item_id,)).fetchone()
+                if row:
+                    rowid = row[0]
+                    conn.execute(f'DELETE FROM {fts_table} WHERE rowid = ?', (rowid,))
+                    conn.execute(f'UPDATE {table} SET doc = ?, synced_at = ? WHERE rowid = ?', (payload, synced_at, rowid))
+                else:
+                    rowid = conn.execute(
+                        f'INSERT INTO {table} ({id_column}, doc, synced_at) VALUES (?, ?, ?)', (item_id, payload, synced_at)
+                    ).lastrowid
+                conn.execute(
+                    f'INSERT INTO {fts_table} (rowid, {FTS_COLUMNS[fts_table]}) VALUES (?, ?, ?)', (rowid, title, text)
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return len(batch)
+
+    def prune(self, table, fts_table, before):
+        """Drop rows a full sync did not see again (deleted or moved out of scope)"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute(f'DELETE FROM {fts_table} WHERE rowid IN (SELECT rowid FROM {table} WHERE synced_at < ?)', (before,))
+        removed = conn.execute(f'DELETE FROM {table} WHERE synced_at < ?', (before,)).rowcount
+        conn.execute('COMMIT')
+        return removed
+
+    def search_issues(self, query, limit):
+        """Issues matching the query, best first (summary hits weigh 10x description hits)"""
+        conn = self._connect()
+        if TICKET_KEY.match(query.strip()):
+            rows = conn.execute('SELECT doc FROM issues WHERE key = ?', (query.strip().upper(),)).fetchall()
+            return [json.loads(row[0]) for row in rows]
+        match = fts_query(query)
+        if not match:
+            return []
+        rows = conn.execute(
+            'SELECT i.doc FROM issues_fts f JOIN issues i ON i.rowid = f.rowid '
+            'WHERE issues_fts MATCH ? ORDER BY bm25(issues_fts, 10.0, 1.0) LIMIT ?',
+            (match, limit)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def search_pages(self, query, limit):
+        """Pages matching the query, best first (title hits weigh 10x body hits)"""
+        match = fts_query(query)
+        if not match:
+            return []
+        rows = self._connect().execute(
+            'SELECT p.doc FROM pages_fts f JOIN pages p ON p.rowid = f.rowid '
+            'WHERE pages_fts MATCH ? ORDER BY bm25(pages_fts, 10.0, 1.0) LIMIT ?',
+            (match, limit)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def stats(self):
+        conn = self._connect()
+        return {
+            'path': self.path,
+            'issues': conn.execute('SELECT COUNT(*) FROM issues').fetchone()[0],
+            'pages': conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0],
+            'last_sync': self.get_state('last_sync'),
+            'last_full_sync': self.get_state('last_full_sync')
+        }
+
+def until_truncated(items, truncated):
+    """Yield items, noting a ScanTruncated at the end in truncated instead of raising it"""
+    try:
+        yield from items
+    except ScanTruncated as e:
+        truncated.append(str(e))
+
+class IndexSync:
+    """Background incremental sync of a LocalIndex from one Atlassian tenant
+
+    fetch_issues(jql) and fetch_pages(cql) yield raw results; the first run (and
+    every full_sync_interval) indexes the whole scope, later runs only fetch what
+    changed since the previous run via relative `updated >= -Nm` / `lastmodified >= now("-Nm")`.
+    A fetch must raise if a page fails, and raise ScanTruncated after its last item if it
+    stopped at a limit: what was fetched is still indexed, but nothing is pruned and the sync
+    times stay put, so the next run covers the same window again.
+    """
+
+    def __init__(self, index, fetch_issues, fetch_pages, jql_scope, cql_scope,
+                 interval=300, full_sync_interval=86400, overlap_minutes=5):
+        self.index = index
+        self.fetch_issues = fetch_issues
+        self.fetch_pages = fetch_pages
+        self.jql_scope = jql_scope
+        self.cql_scope = cql_scope
+        self.interval = interval
+        self.full_sync_interval = full_sync_interval
+        self.overlap_minutes = overlap_minutes
+
+    def is_ready(self):
+        """The index can answer searches once a full sync has completed"""
+        return self.index.get_state('last_full_sync') is not None
+
+    def sync_once(self):
+        started = time.time()
+        last_sync = self.index.get_state('last_sync')
+        last_full = self.index.get_state('last_full_sync')
+        full = last_sync is None or last_full is None or started - last_full >= self.full_sync_interval
+
+        jql = f"({self.jql_scope})"
+        cql = f"({self.cql_scope})"
+        if not full:
+            # Relative offsets avoid any mismatch with the tenant's timezone
+            minutes = math.ceil((started - last_sync) / 60) + self.overlap_minutes
+            jql += f" AND updated >= -{minutes}m"
+            cql += f' AND lastmodified >= now("-{minutes}m")'
+
+        truncated = []
+        issues = self.index.upsert_issues(
+            until_truncated(self.fetch_issues(f"{jql} ORDER BY updated ASC"), truncated), started
+        )
+        pages = self.index.upsert_pages(until_truncated(self.fetch_pages(cql), truncated), started)
+        kind = 'full' if full else 'incremental'
+        if truncated:
+            # A partial scan must not prune what it did not reach, nor count as the sync it was meant to be
+            print(f"Local index {kind} sync incomplete ({'; '.join(truncated)}): {issues} issues, {pages} pages "
+                  f"indexed, raise LOCAL_INDEX_MAX_ITEMS or narrow the scope")
+            return issues, pages
+        if full:
+            self.index.prune('issues', 'issues_fts', started)
+            self.index.prune('pages', 'pages_fts', started)
+            self.index.set_state('last_full_sync', started)
+        self.index.set_state('last_sync', started)
+        print(f"Local index {kind} sync: {issues} issues, {pages} pages in {time.time() - started:.1f}s")
+        return issues, pages
+
+    def _loop(self):
+        while True:
+            try:
+                if self.index.acquire_lease('sync_lease', self.interval):
+                    self.sync_once()
+            except Exception as e:
+                print(f"Local index sync error: {e}")
+            time.sleep(self.interval)
+
+    def start(self):
+        thread = threading.Thread(target=self._loop, name='local-index-sync', daemon=True)
+        thread.start()
+        return thread
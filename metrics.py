@@ -0,0 +1,176 @@
+"""
+Latency histograms, counters and per-request stage timings
+Rendered in the Prometheus text format for /metrics, and as a Server-Timing header
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(8))  # 1 KiB .. 16 MiB
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, labels, value) for labels, value in self._values.items()]
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label combination"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            values = [(labels, list(entry)) for labels, entry in self._values.items()]
+        samples = []
+        for labels, entry in values:
+            for bound, count in zip(self.buckets + (float('inf'),), entry[:-2] + [entry[-1]]):
+                samples.append((f'{self.name}_bucket', labels + (('le', format_value(float(bound))),), count))
+            samples.append((f'{self.name}_sum', labels, entry[-2]))
+            samples.append((f'{self.name}_count', labels, entry[-1]))
+        return samples
+
+class CallbackMetric:
+    """Values read at scrape time from collect(), which returns [(labels dict, value)]
+
+    For numbers kept elsewhere, such as cache statistics; kind is 'gauge' or 'counter'.
+    """
+
+    def __init__(self, name, help_text, collect, kind='gauge'):
+        self.name = name
+        self.help = help_text
+        self.collect = collect
+        self.kind = kind
+
+    def samples(self):
+        return [(self.name, tuple(sorted(labels.items())), value) for labels, value in self.collect()]
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text):
+        return self._add(Counter(name, help_text))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help_text, buckets))
+
+    def callback(self, name, help_text, collect, kind='gauge'):
+        return self._add(CallbackMetric(name, help_text, collect, kind))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                print(f"Metric {metric.name} failed: {e}")
+                continue
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in samples:
+                lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    'atlassian_search_stage_seconds', 'Time spent in each stage of a search (Jira/Confluence requests, ADF, ranking, ...)'
+)
+
+class Timings:
+    """Stage durations of one request, summed per stage, for the Server-Timing header"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self._stages[stage] = self._stages.get(stage, 0.0) + seconds
+
+    def header(self):
+        with self._lock:
+            stages = list(self._stages.items())
+        stages.append(('total', time.perf_counter() - self.started))
+        return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in stages)
+
+current_timings = contextvars.ContextVar('current_timings', default=None)
+
+def record_stage(name, seconds):
+    """Observe a stage duration, and add it to the current request's timings if there is one"""
+    STAGE_SECONDS.observe(seconds, stage=name)
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+@contextmanager
+def stage(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit that carries the caller's request timings into the worker thread"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
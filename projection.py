@@ -0,0 +1,62 @@
+"""
+Compact response schema for /search
+Keeps only what the web UI reads; API clients can ask for more with ?fields=
+"""
+
+# Jira issues carry summary, description_text and the status/issuetype/priority names,
+# Confluence pages their id, title and type (and body_text when page bodies were fetched).
+# Every result also has its relevance score and URL, and issues found by graph expansion
+# say how they are linked to the issue they were reached from.
+
+ALL_FIELDS = '*all'
+
+def parse_fields(value):
+    """Parse a fields= parameter into a set of extra field names, or None for full objects"""
+    names = {name.strip() for name in (value or '').split(',') if name.strip()}
+    if ALL_FIELDS in names:
+        return None
+    return frozenset(names)
+
+def named(name):
+    return {'name': name} if name is not None else None
+
+def project_issue(issue):
+    """Response dict for an IssueRecord"""
+    if issue.raw is not None:
+        projected = {**issue.raw, 'score': issue.score}
+    else:
+        compact = {
+            'summary': issue.summary,
+            'description_text': issue.description_text,
+            'status': named(issue.status),
+            'issuetype': named(issue.issuetype),
+            'priority': named(issue.priority)
+        }
+        if issue.extra:
+            compact.update(issue.extra)
+        projected = {'key': issue.key, 'score': issue.score, 'url': issue.url, 'fields': compact}
+    if issue.linked is not None:
+        projected['linked'] = issue.linked
+    return projected
+
+def project_page(page):
+    """Response dict for a PageRecord"""
+    if page.raw is not None:
+        compact = {**page.raw, 'score': page.score}
+    else:
+        compact = {'id': page.id, 'title': page.title, 'type': page.type, 'url': page.url, 'score': page.score}
+        if page.extra:
+            compact.update(page.extra)
+    if page.body_text is not None:
+        compact['body_text'] = page.body_text
+    return compact
+
+def project_issues(issues):
+    return [project_issue(issue) for issue in issues]
+
+def project_pages(pages):
+    return [project_page(page) for page in pages]
+
+def fields_variant(extra):
+    """Stable cache-key fragment for a parsed fields= parameter"""
+    return ALL_FIELDS if extra is None else ','.join(sorted(extra))
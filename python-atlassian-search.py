@@ -3,674 +3,1563 @@ Atlassian Search Tool (Free Version)
 Searches Jira and Confluence - paste results to Claude chat for test case generation
 """
 
-from flask import Flask, render_template_string, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import requests
-from requests.auth import HTTPBasicAuth
+import gzip
 import json
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+
+from adf import extract_text_from_adf, storage_to_text
+from projection import parse_fields, project_issues, project_pages, fields_variant
+from records import IssueRecord, PageRecord
+from ranking import BM25Ranker, matches_terms, merge_rankings
+from summary_builder import PromptSummary, CHARS_PER_TOKEN, estimate_tokens
+from search_cache import create_cache, normalize_query, search_cache_key, parse_cache_control
+from local_index import LocalIndex, IndexSync, ScanTruncated
+from jira_endpoints import JiraEndpointCache, SEARCH_ENDPOINT, SEARCH_JQL_ENDPOINT
+from session_pool import SessionPool, credential_hash
+from rate_limit import RequestScheduler, RateLimitedError, INTERACTIVE, BATCH, SYNC
+from stream_json import parse_page
+from static_assets import ASSET_PREFIX, UIAssets
+from query_plan import KEY_LOOKUP_MAX, plan_query
+from single_flight import SingleFlight
+import metrics
+from metrics import Timings, current_timings, record_stage, registry, stage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 CORS(app)
+# Key order is irrelevant to the UI; skipping the sort makes large responses cheaper to encode
+app.json.sort_keys = False
+
+# gzip/brotli-encode JSON responses larger than COMPRESS_MIN_SIZE bytes
+COMPRESS_RESPONSES = os.environ.get('COMPRESS_RESPONSES', 'true').lower() in ('1', 'true', 'yes')
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', '1024'))
+
+# Shared pool for running the Jira and Confluence searches side by side
+SEARCH_WORKERS = int(os.environ.get('SEARCH_WORKERS', '16'))
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix='atlassian-search')
+
+# Separate pool for fetching the next result page while the current one is ranked
+# (a search thread waiting on its own pool could deadlock under load)
+prefetch_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix='atlassian-prefetch')
+
+# One page per backend by default; callers can ask for up to SEARCH_MAX_TOTAL results per backend
+PAGE_SIZE = 50
+SEARCH_MAX_TOTAL = int(os.environ.get('SEARCH_MAX_TOTAL', '500'))
+JIRA_TOP_K = 25
+JIRA_FIELDS = ['summary', 'description', 'status', 'issuetype', 'priority', 'key', 'updated']
+# Requested on top of JIRA_FIELDS when an issue's links are followed
+GRAPH_FIELDS = ['issuelinks', 'subtasks', 'parent']
+CONFLUENCE_TOP_K = 50
+
+# Keep-alive sessions per tenant + credential so searches skip the TCP/TLS handshake
+session_pool = SessionPool(
+    max_sessions=int(os.environ.get('ATLASSIAN_MAX_SESSIONS', '32')),
+    pool_size=int(os.environ.get('ATLASSIAN_POOL_SIZE', '10')),
+    idle_timeout=float(os.environ.get('ATLASSIAN_SESSION_IDLE_TIMEOUT', '300')),
+    evict_interval=float(os.environ.get('ATLASSIAN_SESSION_EVICT_INTERVAL', '60'))
+)
+
+# Prometheus metrics on /metrics; SERVER_TIMING=true also reports each request's stages in a Server-Timing header
+SERVER_TIMING = os.environ.get('SERVER_TIMING', 'false').lower() in ('1', 'true', 'yes')
+REQUEST_SECONDS = registry.histogram(
+    'atlassian_search_request_seconds', 'Time to answer an API request (to the first byte for streamed responses)'
+)
+RESPONSE_BYTES = registry.histogram(
+    'atlassian_search_response_bytes', 'Size of API response bodies as sent (after compression)', metrics.SIZE_BUCKETS
+)
+UPSTREAM_REQUESTS = registry.counter('atlassian_upstream_requests_total', 'Requests sent to Atlassian by backend and HTTP status')
+UPSTREAM_SECONDS = registry.histogram('atlassian_upstream_request_seconds', 'Latency of single requests to Atlassian')
+UPSTREAM_BYTES = registry.histogram(
+    'atlassian_upstream_response_bytes', 'Size of Atlassian response bodies', metrics.SIZE_BUCKETS
+)
+
+def observe_upstream(method, url, response, seconds):
+    backend = 'confluence' if '/wiki/' in url else 'jira'
+    status = str(response.status_code) if response is not None else 'error'
+    UPSTREAM_REQUESTS.inc(backend=backend, status=status)
+    UPSTREAM_SECONDS.observe(seconds, backend=backend)
+    # Search pages are streamed, so the body size comes from the header rather than .content
+    length = response.headers.get('Content-Length') if response is not None else None
+    if length and length.isdigit():
+        UPSTREAM_BYTES.observe(int(length), backend=backend)
+    record_stage(f'{backend}_request', seconds)
+
+# Every Atlassian request goes through a per-tenant token bucket and concurrency limit.
+# 429/503 answers are retried after Retry-After; interactive searches go ahead of batch and sync traffic.
+request_scheduler = RequestScheduler(
+    rate=float(os.environ.get('ATLASSIAN_RATE_LIMIT', '10')),
+    burst=int(os.environ.get('ATLASSIAN_RATE_BURST', '20')),
+    max_concurrent=int(os.environ.get('ATLASSIAN_MAX_CONCURRENT', '8')),
+    max_retries=int(os.environ.get('ATLASSIAN_MAX_RETRIES', '4')),
+    max_wait=float(os.environ.get('ATLASSIAN_MAX_RETRY_WAIT', '60')),
+    observer=observe_upstream
+)
+
+# Which Jira search endpoint each tenant supports, so deprecated tenants skip the 410 round trip
+jira_endpoints = JiraEndpointCache(ttl=float(os.environ.get('JIRA_ENDPOINT_CACHE_TTL', '3600')))
+
+def warm_jira_endpoints():
+    """Probe the tenants listed in JIRA_PROBE_BASE_URLS so the first search uses the right endpoint
+
+    The probe is a real search, so it needs the JIRA_PROBE_EMAIL/JIRA_PROBE_TOKEN credential;
+    it is paced by request_scheduler like sync traffic.
+    """
+    base_urls = [url.strip().rstrip('/') for url in os.environ.get('JIRA_PROBE_BASE_URLS', '').split(',') if url.strip()]
+    email = os.environ.get('JIRA_PROBE_EMAIL', '')
+    token = os.environ.get('JIRA_PROBE_TOKEN', '')
+    if base_urls and not (email and token):
+        print("JIRA_PROBE_BASE_URLS is set without JIRA_PROBE_EMAIL/JIRA_PROBE_TOKEN, skipping the endpoint probe")
+        return
+    for base_url in base_urls:
+        session = session_pool.get(base_url, email, token)
+        
+        def post(url, session=session, **kwargs):
+            return request_scheduler.send(session, 'POST', url, SYNC, **kwargs)
+        
+        search_executor.submit(jira_endpoints.probe, post, base_url)
+
+warm_jira_endpoints()
+
+# Ranked results of recent searches - repeat queries skip both Atlassian round trips.
+# CACHE_BACKEND=sqlite shares both caches between worker processes and keeps them across restarts.
+CACHE_COMPACT_INTERVAL = float(os.environ.get('CACHE_COMPACT_INTERVAL', '300'))
+search_cache = create_cache(
+    'search',
+    ttl=float(os.environ.get('SEARCH_CACHE_TTL', '300')),
+    max_bytes=int(os.environ.get('SEARCH_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+    compact_interval=CACHE_COMPACT_INTERVAL,
+    # Expired results stay servable this long while they are refreshed in the background
+    stale_ttl=float(os.environ.get('SEARCH_CACHE_STALE_TTL', '300'))
+)
+
+# Plain text extracted from ADF descriptions, keyed by issue and its updated timestamp
+adf_text_cache = create_cache(
+    'adf_text',
+    ttl=float(os.environ.get('ADF_CACHE_TTL', str(7 * 24 * 3600))),
+    max_bytes=int(os.environ.get('ADF_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+    compact_interval=CACHE_COMPACT_INTERVAL
+)
+
+# Plain text of Confluence page bodies, keyed by page id and version
+page_text_cache = create_cache(
+    'page_text',
+    ttl=float(os.environ.get('PAGE_TEXT_CACHE_TTL', str(7 * 24 * 3600))),
+    max_bytes=int(os.environ.get('PAGE_TEXT_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+    compact_interval=CACHE_COMPACT_INTERVAL
+)
+
+# Issues reached by graph expansion, keyed by the root issues and their updated timestamps
+issue_graph_cache = create_cache(
+    'issue_graph',
+    ttl=float(os.environ.get('ISSUE_GRAPH_CACHE_TTL', '3600')),
+    max_bytes=int(os.environ.get('ISSUE_GRAPH_CACHE_MAX_BYTES', str(32 * 1024 * 1024))),
+    compact_interval=CACHE_COMPACT_INTERVAL
+)
+
+def cache_stat(name):
+    return lambda: [({'cache': cache}, stats[name]) for cache, stats in (
+        ('search', search_cache.stats()), ('adf_text', adf_text_cache.stats()), ('page_text', page_text_cache.stats()),
+        ('issue_graph', issue_graph_cache.stats())
+    )]
+
+registry.callback('atlassian_cache_hits_total', 'Cache lookups that found an entry', cache_stat('hits'), 'counter')
+registry.callback('atlassian_cache_misses_total', 'Cache lookups that found nothing', cache_stat('misses'), 'counter')
+registry.callback('atlassian_cache_hit_ratio', 'Share of cache lookups that were hits', cache_stat('hit_ratio'))
+registry.callback('atlassian_cache_entries', 'Entries currently cached', cache_stat('entries'))
+registry.callback('atlassian_cache_bytes', 'Size of the cached values', cache_stat('bytes'))
+
+def description_text(base_url, issue):
+    """Plain text of an issue description; ADF is flattened once per issue key + updated timestamp"""
+    desc_field = issue['fields'].get('description')
+    if isinstance(desc_field, str):
+        return desc_field
+    if not isinstance(desc_field, dict):
+        return ''
+    key = f"{base_url}|{issue.get('key')}|{issue['fields'].get('updated')}"
+    text = adf_text_cache.get(key)
+    if text is None:
+        text = extract_text_from_adf(desc_field)
+        adf_text_cache.set(key, text)
+    return text
+
+# The UI is served from ui/ as static assets, compressed once and cached by browsers
+ui_assets = UIAssets()
+
+def asset_response(asset):
+    """Serve an Asset in the client's preferred encoding, answering 304 when its copy is current"""
+    encoding = asset.encoding_for(request.accept_encodings)
+    response = Response(asset.encoded[encoding], mimetype=asset.mimetype)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # Each encoding is a different body, so it gets its own ETag
+    response.set_etag(asset.digest if encoding == 'identity' else f"{asset.digest}-{encoding}")
+    response.last_modified = asset.modified
+    response.headers['Cache-Control'] = asset.cache_control
+    return response.make_conditional(request)
+
+@app.route('/')
+def index():
+    return asset_response(ui_assets.get('index.html'))
+
+@app.route(f'{ASSET_PREFIX}<name>')
+def ui_asset(name):
+    asset = ui_assets.get(name)
+    if asset is None or name == 'index.html':
+        return jsonify({'error': 'Not found'}), 404
+    return asset_response(asset)
 
-def extract_text_from_adf(adf_doc):
-    """Extract plain text from Atlassian Document Format"""
-    if not adf_doc or not isinstance(adf_doc, dict):
-        return ""
+class AtlassianAuthError(Exception):
+    """Raised when Atlassian rejects the supplied credentials"""
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+class AtlassianSearchError(Exception):
+    """Raised when a Jira or Confluence search request fails for a reason other than auth"""
+
+def issue_ranking_fields(issue):
+    return {'title': issue.summary, 'body': issue.description_text}
+
+def page_ranking_fields(page):
+    # Rank by title, plus the search excerpt as a stand-in for the body.
+    # Search excerpts mark matches with @@@hl@@@ ... @@@endhl@@@
+    body = (page.excerpt or '').replace('@@@hl@@@', '').replace('@@@endhl@@@', '')
+    return {'title': page.title, 'body': body}
+
+def apply_scores(scored):
+    """Store each BM25 score on its result (shown to API clients, used for summary budgets)"""
+    for score, item in scored:
+        item.score = score
+    return [item for _, item in scored]
+
+def rank_results(query, items, fields_of, k):
+    """Re-score results from another source (e.g. the local index) on the BM25 scale"""
+    ranker = BM25Ranker(query, k)
+    for item in items:
+        ranker.add(item, fields_of(item))
+    return apply_scores(ranker.top(k))
+
+def post_jira_search(session, base_url, payload, priority=INTERACTIVE):
+    """POST a JQL search, falling back to /search/jql (and remembering it) when the tenant answers 410"""
+    endpoint = cached_endpoint = jira_endpoints.get(base_url)
+    started = time.perf_counter()
+    jira_response = request_scheduler.send(
+        session, 'POST', f"{base_url}{endpoint}", priority,
+        json=payload,
+        headers={'Content-Type': 'application/json'},
+        timeout=15,
+        stream=True
+    )
     
-    text_parts = []
+    # Fallback to /search/jql if standard endpoint is deprecated, and remember it
+    if jira_response.status_code == 410 and endpoint == SEARCH_ENDPOINT:
+        # Time lost to the deprecated endpoint before the retry
+        record_stage('jira_410', time.perf_counter() - started)
+        print("Standard search deprecated, trying /search/jql endpoint...")
+        jira_response.close()
+        endpoint = SEARCH_JQL_ENDPOINT
+        jira_response = request_scheduler.send(
+            session, 'POST', f"{base_url}{endpoint}", priority,
+            json=payload,
+            headers={'Content-Type': 'application/json'},
+            timeout=15,
+            stream=True
+        )
     
-    def traverse(node):
-        if isinstance(node, dict):
-            # Extract text content
-            if node.get('type') == 'text':
-                text_parts.append(node.get('text', ''))
-            
-            # Traverse content array
-            if 'content' in node and isinstance(node['content'], list):
-                for child in node['content']:
-                    traverse(child)
-        elif isinstance(node, list):
-            for item in node:
-                traverse(item)
+    if jira_response.status_code in (404, 410):
+        # Cached endpoint stopped working - reprobe on the next search
+        jira_endpoints.forget(base_url)
+    elif jira_response.status_code == 200 and (endpoint != cached_endpoint or not jira_endpoints.is_known(base_url)):
+        # Also replaces a cached endpoint the tenant no longer serves (migrated, or a wrong probe)
+        jira_endpoints.remember(base_url, endpoint)
     
-    traverse(adf_doc)
-    return ' '.join(text_parts)
-
-# HTML Template
-HTML_TEMPLATE = """
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Atlassian Search Tool</title>
-    <style>
-        * { margin: 0; padding: 0; box-sizing: border-box; }
-        body {
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-            padding: 20px;
-        }
-        .container {
-            max-width: 1200px;
-            margin: 0 auto;
-            background: white;
-            border-radius: 16px;
-            box-shadow: 0 20px 60px rgba(0,0,0,0.3);
-            padding: 40px;
-        }
-        h1 {
-            color: #333;
-            margin-bottom: 10px;
-            font-size: 32px;
-        }
-        .subtitle {
-            color: #666;
-            margin-bottom: 30px;
-        }
-        .credentials-box {
-            background: #fff3cd;
-            border: 2px solid #ffc107;
-            border-radius: 8px;
-            padding: 20px;
-            margin-bottom: 30px;
-        }
-        .info-box {
-            background: #d1ecf1;
-            border: 2px solid #17a2b8;
-            border-radius: 8px;
-            padding: 20px;
-            margin-bottom: 30px;
-        }
-        .form-group {
-            margin-bottom: 20px;
-        }
-        label {
-            display: block;
-            font-weight: 600;
-            margin-bottom: 8px;
-            color: #333;
-        }
-        input[type="text"], input[type="email"], input[type="password"] {
-            width: 100%;
-            padding: 12px;
-            border: 2px solid #ddd;
-            border-radius: 8px;
-            font-size: 14px;
-            transition: border-color 0.3s;
-        }
-        input:focus {
-            outline: none;
-            border-color: #667eea;
-        }
-        .search-box {
-            display: flex;
-            gap: 10px;
-            margin-bottom: 20px;
-        }
-        .search-box input {
-            flex: 1;
-        }
-        button {
-            padding: 12px 24px;
-            background: #667eea;
-            color: white;
-            border: none;
-            border-radius: 8px;
-            font-size: 16px;
-            font-weight: 600;
-            cursor: pointer;
-            transition: background 0.3s;
-        }
-        button:hover {
-            background: #5568d3;
-        }
-        button:disabled {
-            background: #ccc;
-            cursor: not-allowed;
-        }
-        .results-section {
-            margin-top: 30px;
-        }
-        .results-box {
-            background: #f8f9fa;
-            border-radius: 8px;
-            padding: 20px;
-            margin-bottom: 20px;
-        }
-        .result-item {
-            background: white;
-            padding: 15px;
-            border-radius: 6px;
-            margin-bottom: 10px;
-            border-left: 4px solid #667eea;
-        }
-        .result-title {
-            font-weight: 600;
-            color: #667eea;
-            margin-bottom: 5px;
-        }
-        .result-description {
-            color: #666;
-            font-size: 14px;
-            margin-bottom: 8px;
-        }
-        .result-meta {
-            font-size: 12px;
-            color: #999;
-        }
-        .error {
-            background: #f8d7da;
-            border: 2px solid #f5c6cb;
-            color: #721c24;
-            padding: 15px;
-            border-radius: 8px;
-            margin-bottom: 20px;
-        }
-        .success {
-            background: #d4edda;
-            border: 2px solid #c3e6cb;
-            color: #155724;
-            padding: 15px;
-            border-radius: 8px;
-            margin-bottom: 20px;
-        }
-        .summary-box {
-            background: #e7f3ff;
-            border: 2px solid #2196F3;
-            border-radius: 8px;
-            padding: 20px;
-            margin-top: 30px;
-        }
-        .summary-box textarea {
-            width: 100%;
-            min-height: 300px;
-            padding: 15px;
-            border: 2px solid #ddd;
-            border-radius: 8px;
-            font-family: 'Courier New', monospace;
-            font-size: 13px;
-            line-height: 1.6;
-            resize: vertical;
-        }
-        .spinner {
-            border: 3px solid #f3f3f3;
-            border-top: 3px solid #667eea;
-            border-radius: 50%;
-            width: 20px;
-            height: 20px;
-            animation: spin 1s linear infinite;
-            display: inline-block;
-            margin-right: 10px;
-        }
-        @keyframes spin {
-            0% { transform: rotate(0deg); }
-            100% { transform: rotate(360deg); }
-        }
-        .grid {
-            display: grid;
-            grid-template-columns: 1fr 1fr;
-            gap: 15px;
-        }
-        @media (max-width: 768px) {
-            .grid {
-                grid-template-columns: 1fr;
-            }
-        }
-        .button-group {
-            display: flex;
-            gap: 10px;
-            margin-top: 15px;
-        }
-        .badge {
-            background: #28a745;
-            color: white;
-            padding: 2px 8px;
-            border-radius: 4px;
-            font-size: 11px;
-            margin-left: 8px;
-        }
-        .badge-high {
-            background: #007bff;
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>🔍 Atlassian Search Tool</h1>
-        <p class="subtitle">Search Jira & Confluence, then use Claude chat for free test case generation</p>
-
-        <div class="info-box">
-            <h3 style="margin-bottom: 10px;">💡 How This Works (Free Version)</h3>
-            <ol style="margin-left: 20px; line-height: 1.8;">
-                <li>Enter your Atlassian credentials below</li>
-                <li>Search for your feature (e.g., "shopping list")</li>
-                <li>Review the results from Jira and Confluence</li>
-                <li>Click "Copy Summary for Claude" button</li>
-                <li>Paste the summary in your Claude chat</li>
-                <li>Claude will generate test cases for FREE! 🎉</li>
-            </ol>
-        </div>
-
-        <div class="credentials-box">
-            <h3 style="margin-bottom: 15px;">⚙️ Configuration</h3>
-            <div class="grid">
-                <div class="form-group">
-                    <label>Atlassian Email:</label>
-                    <input type="email" id="email" placeholder="your-email@example.com">
-                </div>
-                <div class="form-group">
-                    <label>API Token:</label>
-                    <input type="password" id="token" placeholder="Your Atlassian API token">
-                </div>
-            </div>
-            <div class="form-group">
-                <label>Atlassian Base URL:</label>
-                <input type="text" id="baseUrl" value="https://edocgroup.atlassian.net" placeholder="https://your-domain.atlassian.net">
-            </div>
-            <p style="font-size: 12px; color: #856404; margin-top: 10px;">
-                💡 Create API token at: <a href="https://id.atlassian.com/manage-profile/security/api-tokens" target="_blank">Atlassian Settings</a>
-            </p>
-        </div>
-
-        <div class="form-group">
-            <label>🔎 Search Query:</label>
-            <div class="search-box">
-                <input type="text" id="searchQuery" placeholder="e.g., shopping list OR CD-27453" onkeypress="if(event.key==='Enter') searchAtlassian()">
-                <button onclick="searchAtlassian()" id="searchBtn">Search</button>
-            </div>
-            <p style="font-size: 12px; color: #666; margin-top: 5px;">
-                💡 Tip: You can search by keywords or by ticket ID (e.g., "CD-27453")
-            </p>
-        </div>
-
-        <div id="errorMsg" style="display:none;" class="error"></div>
-        <div id="successMsg" style="display:none;" class="success"></div>
-
-        <div id="results" style="display:none;" class="results-section">
-            <h3>📋 Jira Results (<span id="jiraCount">0</span>)</h3>
-            <div id="jiraResults" class="results-box"></div>
-
-            <h3>📄 Confluence Results (<span id="confluenceCount">0</span>)</h3>
-            <div id="confluenceResults" class="results-box"></div>
-
-            <div class="summary-box">
-                <h3 style="margin-bottom: 15px;">📝 Summary for Claude</h3>
-                <p style="margin-bottom: 10px; color: #666;">Copy this text and paste it in your Claude chat to generate test cases:</p>
-                <textarea id="summaryText" readonly></textarea>
-                <div class="button-group">
-                    <button onclick="copySummary()" style="background: #28a745;">
-                        📋 Copy Summary for Claude
-                    </button>
-                    <button onclick="window.open('https://claude.ai', '_blank')" style="background: #6c757d;">
-                        🔗 Open Claude Chat
-                    </button>
-                </div>
-            </div>
-        </div>
-    </div>
-
-    <script>
-        let searchResults = null;
-
-        function showError(msg) {
-            document.getElementById('errorMsg').textContent = msg;
-            document.getElementById('errorMsg').style.display = 'block';
-            document.getElementById('successMsg').style.display = 'none';
-        }
-
-        function showSuccess(msg) {
-            document.getElementById('successMsg').textContent = msg;
-            document.getElementById('successMsg').style.display = 'block';
-            document.getElementById('errorMsg').style.display = 'none';
-        }
-
-        function hideMessages() {
-            document.getElementById('errorMsg').style.display = 'none';
-            document.getElementById('successMsg').style.display = 'none';
-        }
-
-        async function searchAtlassian() {
-            const email = document.getElementById('email').value;
-            const token = document.getElementById('token').value;
-            const baseUrl = document.getElementById('baseUrl').value;
-            const query = document.getElementById('searchQuery').value;
-
-            if (!email || !token || !query) {
-                showError('Please fill in all fields');
-                return;
-            }
-
-            hideMessages();
-            const searchBtn = document.getElementById('searchBtn');
-            searchBtn.disabled = true;
-            searchBtn.innerHTML = '<span class="spinner"></span>Searching...';
-
-            try {
-                const response = await fetch('/search', {
-                    method: 'POST',
-                    headers: {'Content-Type': 'application/json'},
-                    body: JSON.stringify({ email, token, baseUrl, query })
-                });
-
-                const data = await response.json();
-
-                if (!response.ok) {
-                    showError(data.error || 'Search failed');
-                    return;
-                }
-
-                searchResults = data;
-                displayResults(data);
-                generateSummary(query, data);
-                showSuccess(`Found ${data.jira.length} Jira tickets and ${data.confluence.length} Confluence pages! Now copy the summary and paste it to Claude.`);
-
-            } catch (err) {
-                showError('Search failed: ' + err.message);
-            } finally {
-                searchBtn.disabled = false;
-                searchBtn.innerHTML = 'Search';
-            }
-        }
-
-        function displayResults(data) {
-            document.getElementById('jiraCount').textContent = data.jira.length;
-            document.getElementById('confluenceCount').textContent = data.confluence.length;
-
-            // Display Jira results
-            let jiraHtml = '';
-            if (data.jira && data.jira.length > 0) {
-                data.jira.forEach(issue => {
-                    // Use extracted description text if available
-                    let descText = issue.fields.description_text || 'No description';
-                    
-                    if (descText && descText.length > 200) {
-                        descText = descText.substring(0, 200) + '...';
-                    }
-                    
-                    jiraHtml += `
-                        <div class="result-item">
-                            <div class="result-title">${issue.key}: ${issue.fields.summary || 'No summary'}</div>
-                            <div class="result-description">${descText}</div>
-                            <div class="result-meta">
-                                Status: ${issue.fields.status ? issue.fields.status.name : 'Unknown'} | 
-                                Type: ${issue.fields.issuetype ? issue.fields.issuetype.name : 'Unknown'}
-                            </div>
-                        </div>
-                    `;
-                });
-            } else {
-                jiraHtml = '<p>No Jira tickets found</p>';
-            }
-
-            document.getElementById('jiraResults').innerHTML = jiraHtml;
-
-            // Display Confluence results
-            const query = document.getElementById('searchQuery').value.toLowerCase();
-            let confluenceHtml = '';
-            
-            if (data.confluence && data.confluence.length > 0) {
-                data.confluence.forEach(page => {
-                    const title = page.title.toLowerCase();
-                    let badge = '';
-                    
-                    if (title === query) {
-                        badge = '<span class="badge">EXACT MATCH</span>';
-                    } else if (title.includes(query)) {
-                        badge = '<span class="badge badge-high">HIGH RELEVANCE</span>';
-                    }
-                    
-                    confluenceHtml += `
-                        <div class="result-item">
-                            <div class="result-title">${page.title}${badge}</div>
-                            <div class="result-meta">Type: ${page.type}</div>
-                        </div>
-                    `;
-                });
-            } else {
-                confluenceHtml = '<p>No Confluence pages found</p>';
-            }
-
-            document.getElementById('confluenceResults').innerHTML = confluenceHtml;
-            document.getElementById('results').style.display = 'block';
-        }
-
-        function generateSummary(query, data) {
-            let summary = `I searched my Atlassian instance for "${query}" and found the following information. Please generate comprehensive test cases based on this:\n\n`;
-            
-            summary += `=== JIRA TICKETS (${data.jira.length} found) ===\n\n`;
+    return endpoint, jira_response
+
+def next_jira_page(endpoint, payload, data, fetched, max_total):
+    """Payload for the next Jira page, or None when there is nothing more to fetch"""
+    remaining = max_total - fetched
+    if remaining <= 0 or not data.get('issues'):
+        return None
+    page_size = min(PAGE_SIZE, remaining)
+    if endpoint == SEARCH_JQL_ENDPOINT:
+        # /search/jql pages with an opaque token instead of offsets
+        token = data.get('nextPageToken')
+        if not token or data.get('isLast'):
+            return None
+        return {**payload, 'nextPageToken': token, 'maxResults': page_size}
+    start_at = data.get('startAt', 0) + len(data['issues'])
+    if start_at >= data.get('total', 0):
+        return None
+    return {**payload, 'startAt': start_at, 'maxResults': page_size}
+
+def fetch_page(session, method, url, priority, key, project=None, **kwargs):
+    """Request one page of search results and stream-parse it (see parse_page)
+
+    Returns (status code, parsed body) - the body is the error text when the status isn't 200.
+    """
+    response = request_scheduler.send(session, method, url, priority, stream=True, **kwargs)
+    if response.status_code != 200:
+        return response.status_code, response.text
+    return 200, parse_page(response, key, project)
+
+def iter_jira_pages(session, base_url, endpoint, payload, data, max_total, priority=INTERACTIVE, project=None,
+                    strict=False):
+    """Yield pages of issues up to max_total, fetching the next page while the caller ranks this one
+
+    Later pages are parsed in the prefetch thread, with project() applied to each issue.
+    A page that fails ends the search early, or raises with strict (for callers that need every page).
+    """
+    fetched = 0
+    while True:
+        issues = data.get('issues', [])[:max_total - fetched]
+        fetched += len(issues)
+        payload = next_jira_page(endpoint, payload, data, fetched, max_total)
+        future = None
+        if payload:
+            future = metrics.submit(
+                prefetch_executor, fetch_page,
+                session, 'POST', f"{base_url}{endpoint}", priority, 'issues', project,
+                json=payload,
+                headers={'Content-Type': 'application/json'},
+                timeout=15
+            )
+        
+        yield issues
+        
+        if future is None:
+            return
+        try:
+            status, data = future.result()
+        except (requests.exceptions.RequestException, RateLimitedError, ValueError) as e:
+            if strict:
+                raise
+            print(f"Jira page fetch error: {e}")
+            return
+        if status != 200:
+            if strict:
+                raise AtlassianSearchError(f"Jira error: {status} - {data}")
+            print(f"Jira error: {status} - {data}")
+            return
+
+def iter_confluence_pages(session, base_url, data, max_total, priority=INTERACTIVE, project=None, strict=False):
+    """Yield pages of search results up to max_total, following the _links.next cursor ahead of the caller
+
+    A page that fails ends the search early, or raises with strict.
+    """
+    fetched = 0
+    while True:
+        results = data.get('results', [])[:max_total - fetched]
+        fetched += len(results)
+        links = data.get('_links', {})
+        future = None
+        if results and links.get('next') and fetched < max_total:
+            link_base = links.get('base') or f"{base_url}/wiki"
+            future = metrics.submit(
+                prefetch_executor, fetch_page,
+                session, 'GET', f"{link_base}{links['next']}", priority, 'results', project, timeout=15
+            )
+        
+        yield results
+        
+        if future is None:
+            return
+        try:
+            status, data = future.result()
+        except (requests.exceptions.RequestException, RateLimitedError, ValueError) as e:
+            if strict:
+                raise
+            print(f"Confluence page fetch error: {e}")
+            return
+        if status != 200:
+            if strict:
+                raise AtlassianSearchError(f"Confluence error: {status} - {data}")
+            print(f"Confluence error: {status} - {data}")
+            return
+
+def jira_fields(extra_fields=(), with_links=False):
+    """JIRA_FIELDS plus the extra fields a caller asked for (and GRAPH_FIELDS for with_links)"""
+    fields = JIRA_FIELDS + (GRAPH_FIELDS if with_links else [])
+    return fields + sorted(set(extra_fields or ()) - set(fields) - {'description_text'})
+
+def check_jira_status(response):
+    """Raise for a failed Jira request: AtlassianAuthError for 401/403, AtlassianSearchError otherwise"""
+    if response.status_code == 401:
+        raise AtlassianAuthError('Authentication failed. Check your email and API token.', 401)
+    elif response.status_code == 403:
+        raise AtlassianAuthError('Access denied. Check your permissions.', 403)
+    elif response.status_code != 200:
+        raise AtlassianSearchError(f"Jira error: {response.status_code} - {response.text}")
+
+class IssueCompactor:
+    """Per-issue projection applied while a search page is parsed
+
+    Turns each issue into an IssueRecord with its description flattened to text, so the
+    raw ADF and the rest of the API dict are dropped as soon as the issue is read.
+    extra_fields are kept as-is (None keeps the whole issue). Time spent flattening ADF
+    is summed in seconds.
+    """
+
+    def __init__(self, base_url, extra_fields=()):
+        self.base_url = base_url
+        self.extra_fields = extra_fields
+        self.seconds = 0.0
+
+    def __call__(self, issue):
+        started = time.perf_counter()
+        text = description_text(self.base_url, issue)
+        self.seconds += time.perf_counter() - started
+        if self.extra_fields is None:
+            issue.setdefault('fields', {})['description_text'] = text
+        return IssueRecord.from_issue(issue, self.base_url, text, self.extra_fields)
+
+def page_compactor(base_url, extra_fields=()):
+    """Per-result projection for Confluence search pages: a PageRecord, or None for results without content"""
+    def compact(item):
+        content = item.get('content')
+        if not content:
+            return None
+        return PageRecord.from_content(content, base_url, item.get('excerpt'), extra_fields)
+    return compact
+
+def iter_jira_issues(session, base_url, jql, max_total=PAGE_SIZE, extra_fields=(), priority=INTERACTIVE,
+                     with_links=False):
+    """Yield an IssueRecord for each issue matching jql, up to max_total
+
+    extra_fields are requested on top of JIRA_FIELDS and kept on the records
+    (None keeps the whole issue). with_links also fetches the links graph expansion follows.
+    """
+    jira_payload = {
+        'jql': jql,
+        'maxResults': min(PAGE_SIZE, max_total),
+        'fields': jira_fields(extra_fields, with_links)
+    }
+    
+    endpoint, jira_response = post_jira_search(session, base_url, jira_payload, priority)
+    check_jira_status(jira_response)
+    
+    compact = IssueCompactor(base_url, extra_fields)
+    try:
+        data = parse_page(jira_response, 'issues', compact)
+        for page in iter_jira_pages(session, base_url, endpoint, jira_payload, data, max_total, priority, compact):
+            yield from page
+    finally:
+        record_stage('adf', compact.seconds)
+
+def iter_confluence_results(session, base_url, cql, max_total=PAGE_SIZE, extra_fields=(), priority=INTERACTIVE,
+                            with_version=False):
+    """Yield a PageRecord for each page matching cql, up to max_total
+
+    with_version also asks for each page's version, which keys the page body cache.
+    """
+    # Use the search endpoint that powers the UI search
+    confluence_url = f"{base_url}/wiki/rest/api/search"
+    confluence_params = {
+        'cql': f'type=page AND ({cql})',
+        'limit': min(PAGE_SIZE, max_total)
+    }
+    if with_version:
+        confluence_params['expand'] = 'content.version'
+
+    compact = page_compactor(base_url, extra_fields)
+    status, data = fetch_page(
+        session, 'GET', confluence_url, priority, 'results', compact, params=confluence_params, timeout=15
+    )
+    
+    if status != 200:
+        raise AtlassianSearchError(f"Confluence error: {status} - {data}")
+    
+    for page in iter_confluence_pages(session, base_url, data, max_total, priority, compact):
+        for record in page:
+            if record is not None:
+                yield record
+
+def start_key_lookups(session, base_url, keys, extra_fields=(), priority=INTERACTIVE, with_links=False):
+    """Request each issue with GET /rest/api/3/issue/{key}, in parallel on the prefetch pool
+
+    Returns (key, future) pairs for finish_key_lookups.
+    """
+    params = {'fields': ','.join(jira_fields(extra_fields, with_links))}
+    return [
+        (key, metrics.submit(
+            prefetch_executor, request_scheduler.send,
+            session, 'GET', f"{base_url}/rest/api/3/issue/{key}", priority, params=params, timeout=15
+        ))
+        for key in keys
+    ]
+
+def finish_key_lookups(lookups, base_url, extra_fields=(), missing=None):
+    """IssueRecords for the looked-up keys that exist (404s are skipped, and their keys added to missing)"""
+    compact = IssueCompactor(base_url, extra_fields)
+    issues = []
+    try:
+        for key, future in lookups:
+            response = future.result()
+            if response.status_code == 404:
+                if missing is not None:
+                    missing.append(key)
+                continue
+            check_jira_status(response)
+            issues.append(compact(response.json()))
+    finally:
+        record_stage('adf', compact.seconds)
+    return issues
+
+def rank_issues(issues, text):
+    """The best JIRA_TOP_K issues by BM25 against text"""
+    ranker = BM25Ranker(text, JIRA_TOP_K)
+    rank_seconds = 0.0
+    for issue in issues:
+        started = time.perf_counter()
+        ranker.add(issue, issue_ranking_fields(issue))
+        rank_seconds += time.perf_counter() - started
+    started = time.perf_counter()
+    ranked = apply_scores(ranker.top(JIRA_TOP_K))
+    record_stage('jira_rank', rank_seconds + time.perf_counter() - started)
+    return ranked
+
+# "expand": N in a /search body also returns the issues linked to the ones the query names
+# by key: issue links, sub-tasks, parents and epic children, up to N levels out
+ISSUE_GRAPH_DEPTH = int(os.environ.get('ISSUE_GRAPH_DEPTH', '0'))
+ISSUE_GRAPH_MAX_DEPTH = int(os.environ.get('ISSUE_GRAPH_MAX_DEPTH', '3'))
+ISSUE_GRAPH_MAX_ISSUES = int(os.environ.get('ISSUE_GRAPH_MAX_ISSUES', '100'))
+
+def graph_cache_key(session, base_url, roots, depth, extra_fields):
+    """Cache key for the graph around roots; a root edited since (new updated) gets a new key"""
+    credential = credential_hash(session.auth.username, session.auth.password)
+    nodes = ','.join(sorted(f"{root.key}@{root.updated}" for root in roots))
+    return f"{base_url}|{credential}|{nodes}|depth={depth}|fields={fields_variant(extra_fields)}"
+
+def fetch_graph_level(session, base_url, level, edges, limit, extra_fields=(), priority=INTERACTIVE):
+    """The issues one hop from level: the linked keys in edges and the children of level
+
+    key in (...) fails as a whole when one listed issue is gone or hidden, so on an error the
+    linked keys are fetched one by one (404s skipped) and only parent in (...) stays JQL.
+    """
+    children = f"parent in ({', '.join(issue.key for issue in level)})"
+    if edges:
+        jql = f"key in ({', '.join(edges)}) OR {children}"
+        print(f"Issue graph level: {jql}")
+        try:
+            return list(iter_jira_issues(session, base_url, jql, limit, extra_fields, priority, with_links=True))
+        except AtlassianSearchError as e:
+            print(f"Issue graph level failed ({e}), fetching the linked issues by key")
+    
+    keys = list(edges)
+    issues = []
+    for start in range(0, len(keys), KEY_LOOKUP_MAX):
+        lookups = start_key_lookups(session, base_url, keys[start:start + KEY_LOOKUP_MAX], extra_fields, priority, True)
+        issues += finish_key_lookups(lookups, base_url, extra_fields)
+    if len(issues) < limit:
+        print(f"Issue graph level: {children}")
+        issues += iter_jira_issues(session, base_url, children, limit - len(issues), extra_fields, priority, with_links=True)
+    return issues
+
+def expand_issue_graph(session, base_url, roots, depth, extra_fields=(), priority=INTERACTIVE):
+    """Issues linked to roots up to depth levels out, breadth first (at most ISSUE_GRAPH_MAX_ISSUES)
+
+    Each level is one JQL search: key in (...) for the links, sub-tasks and parents of the
+    level before, OR parent in (...) for its children (see fetch_graph_level). A visited set
+    keeps every issue to its first appearance. roots must have been fetched with_links.
+    """
+    if depth <= 0 or not roots:
+        return []
+    cache_key = graph_cache_key(session, base_url, roots, depth, extra_fields)
+    cached = issue_graph_cache.get(cache_key)
+    if cached is not None:
+        return [IssueRecord.load(values) for values in cached]
+    
+    started = time.perf_counter()
+    visited = {root.key for root in roots}
+    found = []
+    level = roots
+    try:
+        for hop in range(1, depth + 1):
+            remaining = ISSUE_GRAPH_MAX_ISSUES - len(found)
+            if not level or remaining <= 0:
+                break
+            edges = {}
+            for issue in level:
+                for key, relation in issue.links:
+                    if key not in visited and key not in edges and len(edges) < remaining:
+                        edges[key] = {'from': issue.key, 'relation': relation, 'depth': hop}
+            issues = fetch_graph_level(session, base_url, level, edges, remaining, extra_fields, priority)
             
-            if (data.jira && data.jira.length > 0) {
-                data.jira.forEach(issue => {
-                    // Use extracted description text if available
-                    const descText = issue.fields.description_text || 'No description';
-                    
-                    summary += `Ticket: ${issue.key}\n`;
-                    summary += `Summary: ${issue.fields.summary || 'No summary'}\n`;
-                    summary += `Description: ${descText}\n`;
-                    summary += `Status: ${issue.fields.status ? issue.fields.status.name : 'Unknown'}\n`;
-                    summary += `Type: ${issue.fields.issuetype ? issue.fields.issuetype.name : 'Unknown'}\n`;
-                    summary += `Priority: ${issue.fields.priority ? issue.fields.priority.name : 'Not set'}\n`;
-                    summary += `\n---\n\n`;
-                });
-            }
-
-            summary += `\n=== CONFLUENCE PAGES (${data.confluence.length} found) ===\n\n`;
+            level = []
+            for issue in issues:
+                if issue.key in visited:
+                    continue
+                visited.add(issue.key)
+                issue.linked = edges.get(issue.key)
+                if issue.linked is None:
+                    parent = next((key for key, relation in issue.links if relation == 'parent of'), None)
+                    issue.linked = {'from': parent, 'relation': 'child of', 'depth': hop}
+                level.append(issue)
+            found += level
+    except AtlassianSearchError as e:
+        # e.g. the tenant failing mid-walk; keep what was found, but do not cache it
+        print(f"Issue graph expansion stopped: {e}")
+        return found
+    finally:
+        record_stage('issue_graph', time.perf_counter() - started)
+    
+    issue_graph_cache.set(cache_key, [issue.dump() for issue in found])
+    return found
+
+def search_jira(session, base_url, query, max_total=PAGE_SIZE, extra_fields=(), priority=INTERACTIVE,
+                expand_depth=0):
+    """Search Jira and return issues ranked by relevance (None if the search failed)
+
+    The query is planned by query_plan. Issue keys (up to max_total) are fetched directly,
+    the first KEY_LOOKUP_MAX in parallel with the text search, and come first with score 1.0, followed by the issues linked
+    to them up to expand_depth levels out; the text search follows startAt/nextPageToken
+    until max_total issues have been scanned and keeps the best JIRA_TOP_K by BM25. A key no
+    issue answers to is searched as a word instead, as Confluence does.
+    extra_fields are requested on top of JIRA_FIELDS.
+    """
+    jira_results = None
+    search_started = time.perf_counter()
+    try:
+        plan = plan_query(query)
+        # Keys are fetched one by one, KEY_LOOKUP_MAX at a time: key in (...) would fail as a
+        # whole on a single mistyped or hidden key, where a lone GET just answers 404
+        keys = plan.keys[:max_total]
+        key_batches = [keys[start:start + KEY_LOOKUP_MAX] for start in range(0, len(keys), KEY_LOOKUP_MAX)]
+        key_lookups = []
+        if key_batches:
+            key_lookups = start_key_lookups(session, base_url, key_batches[0], extra_fields, priority, expand_depth > 0)
+        
+        ranked = []
+        if plan.jql:
+            print(f"JQL Query: {plan.jql}")
+            ranked = rank_issues(iter_jira_issues(session, base_url, plan.jql, max_total, extra_fields, priority), plan.text)
+        
+        missing = []
+        exact = finish_key_lookups(key_lookups, base_url, extra_fields, missing)
+        for batch in key_batches[1:]:
+            exact += finish_key_lookups(
+                start_key_lookups(session, base_url, batch, extra_fields, priority, expand_depth > 0),
+                base_url, extra_fields, missing
+            )
+        if missing:
+            # No such issues - the "keys" may be plain words such as "utf-8" or "iOS-17", which
+            # Confluence searches as words too; search the issue text for them as well
+            jql = plan.jql_with_words(missing)
+            print(f"JQL Query: {jql}")
+            ranked = rank_issues(
+                iter_jira_issues(session, base_url, jql, max_total, extra_fields, priority),
+                ' '.join((plan.text,) + tuple(missing)).strip()
+            )
+        
+        linked = expand_issue_graph(session, base_url, exact, expand_depth, extra_fields, priority)
+        
+        # Issues asked for by key (and those linked to them) are returned as-is, ahead of the ranked ones
+        for issue in exact + linked:
+            issue.score = 1.0
+        found = {issue.key for issue in exact + linked}
+        jira_results = exact + linked + [issue for issue in ranked if issue.key not in found]
             
-            if (data.confluence && data.confluence.length > 0) {
-                data.confluence.forEach(page => {
-                    summary += `Page: ${page.title}\n`;
-                    summary += `Type: ${page.type}\n`;
-                    summary += `\n---\n\n`;
-                });
-            }
-
-            summary += `\nPlease generate comprehensive test cases including:\n`;
-            summary += `1. Test case ID and title\n`;
-            summary += `2. Preconditions\n`;
-            summary += `3. Test steps (numbered)\n`;
-            summary += `4. Expected results\n`;
-            summary += `5. Priority level\n`;
-            summary += `6. Both positive and negative test scenarios\n`;
-            summary += `7. Edge cases\n`;
-
-            document.getElementById('summaryText').value = summary;
-        }
-
-        function copySummary() {
-            const text = document.getElementById('summaryText').value;
-            navigator.clipboard.writeText(text).then(() => {
-                showSuccess('✅ Summary copied! Now paste it in your Claude chat to generate test cases.');
-            }).catch(() => {
-                showError('Failed to copy. Please select and copy manually.');
-            });
-        }
-    </script>
-</body>
-</html>
-"""
+    except (AtlassianAuthError, RateLimitedError):
+        raise
+    except AtlassianSearchError as e:
+        print(e)
+    except requests.exceptions.Timeout:
+        print("Jira search timed out")
+    except Exception as e:
+        print(f"Jira search error: {e}")
+    finally:
+        record_stage('jira', time.perf_counter() - search_started)
+    
+    return jira_results
 
-@app.route('/')
-def index():
-    return render_template_string(HTML_TEMPLATE)
+def search_confluence(session, base_url, query, max_total=PAGE_SIZE, extra_fields=(), priority=INTERACTIVE,
+                      body_pages=0):
+    """Search Confluence pages and return them ranked by relevance (None if the search failed)
+
+    Follows the _links.next cursor until max_total results have been scanned and keeps
+    the best CONFLUENCE_TOP_K by BM25. The body text of the best body_pages is fetched
+    as well (see attach_page_bodies).
+    """
+    confluence_results = None
+    search_started = time.perf_counter()
+    try:
+        plan = plan_query(query)
+        if plan.cql is None:
+            # Nothing for Confluence in the query (e.g. only a project filter)
+            return []
+        print(f"Confluence Search Query: {plan.cql}")
+        
+        ranker = BM25Ranker(' '.join(plan.phrases + plan.terms + plan.keys), CONFLUENCE_TOP_K)
+        rank_seconds = 0.0
+        pages = iter_confluence_results(
+            session, base_url, plan.cql, max_total, extra_fields, priority, with_version=body_pages > 0
+        )
+        for page in pages:
+            started = time.perf_counter()
+            ranker.add(page, page_ranking_fields(page))
+            rank_seconds += time.perf_counter() - started
+        started = time.perf_counter()
+        confluence_results = apply_scores(ranker.top(CONFLUENCE_TOP_K))
+        record_stage('confluence_rank', rank_seconds + time.perf_counter() - started)
+        attach_page_bodies(session, base_url, confluence_results, body_pages, priority)
+        
+    except RateLimitedError:
+        raise
+    except AtlassianSearchError as e:
+        print(e)
+    except requests.exceptions.Timeout:
+        print("Confluence search timed out")
+    except Exception as e:
+        print(f"Confluence search error: {e}")
+    finally:
+        record_stage('confluence', time.perf_counter() - search_started)
+    
+    return confluence_results
+
+# Page bodies for the top Confluence results, so summaries can include what the pages say.
+# CONFLUENCE_BODY_PAGES sets how many pages per search get one (0 = off); "pageBodies" overrides it per request.
+CONFLUENCE_BODY_PAGES = int(os.environ.get('CONFLUENCE_BODY_PAGES', '0'))
+# The v2 pages endpoint returns up to 250 pages, with bodies, for a list of ids
+BULK_PAGES_ENDPOINT = '/wiki/api/v2/pages'
+# Tenants without the v2 API (Server/Data Center, which answer 404) - their bodies are fetched page by page
+no_bulk_pages = set()
+
+def body_text(body):
+    """Plain text of a page body in storage (XHTML) or atlas_doc_format (ADF) representation"""
+    storage = (body.get('storage') or {}).get('value')
+    if storage:
+        return storage_to_text(storage)
+    adf_doc = (body.get('atlas_doc_format') or {}).get('value')
+    if isinstance(adf_doc, str):
+        adf_doc = json.loads(adf_doc) if adf_doc else None
+    return extract_text_from_adf(adf_doc)
+
+def page_body(item):
+    """Reduce a page with its body to {id, version, text} while the response is parsed"""
+    version = item.get('version') or {}
+    return {'id': str(item.get('id')), 'version': version.get('number'), 'text': body_text(item.get('body') or {})}
+
+def fetch_bulk_bodies(session, base_url, page_ids, priority):
+    """{page id: (version, text)} from one v2 request, or None to fetch these pages one by one
+
+    Only a 404 (no v2 API) marks the tenant for good; a 400 is about this request, so the
+    next one tries the bulk endpoint again.
+    """
+    status, data = fetch_page(
+        session, 'GET', f"{base_url}{BULK_PAGES_ENDPOINT}", priority, 'results', page_body,
+        params={'id': ','.join(page_ids), 'body-format': 'storage', 'limit': len(page_ids)},
+        timeout=15
+    )
+    if status == 404:
+        no_bulk_pages.add(base_url)
+        return None
+    if status == 400:
+        print(f"Confluence page bodies rejected, fetching them one by one: {data}")
+        return None
+    if status != 200:
+        raise AtlassianSearchError(f"Confluence page bodies error: {status} - {data}")
+    return {page['id']: (page['version'], page['text']) for page in data['results']}
+
+def fetch_single_body(session, base_url, page_id, priority):
+    response = request_scheduler.send(
+        session, 'GET', f"{base_url}/wiki/rest/api/content/{page_id}", priority,
+        params={'expand': 'body.storage,version'}, timeout=15
+    )
+    if response.status_code != 200:
+        raise AtlassianSearchError(f"Confluence page {page_id} error: {response.status_code} - {response.text}")
+    data = response.json()
+    return (data.get('version') or {}).get('number'), body_text(data.get('body') or {})
+
+def fetch_page_bodies(session, base_url, page_ids, priority):
+    """{page id: (version, text)}, in one bulk request where the tenant supports it
+
+    Otherwise the pages are requested in parallel on the prefetch pool; the tenant's
+    scheduler limits how many of them are in flight at once.
+    """
+    if base_url not in no_bulk_pages:
+        bodies = fetch_bulk_bodies(session, base_url, page_ids, priority)
+        if bodies is not None:
+            return bodies
+    futures = {
+        page_id: metrics.submit(prefetch_executor, fetch_single_body, session, base_url, page_id, priority)
+        for page_id in page_ids
+    }
+    bodies = {}
+    for page_id, future in futures.items():
+        try:
+            bodies[page_id] = future.result()
+        except Exception as e:
+            print(f"Confluence page body error: {e}")
+    return bodies
+
+def attach_page_bodies(session, base_url, pages, count, priority=INTERACTIVE):
+    """Fill in body_text on the first count pages; returns pages
+
+    Bodies already converted are taken from page_text_cache by page id and version,
+    the rest are fetched together (never one round trip after another). Failures
+    leave body_text unset rather than failing the search.
+    """
+    if not pages or count <= 0:
+        return pages
+    started = time.perf_counter()
+    missing = []
+    for page in pages[:count]:
+        text = None
+        if page.version is not None:
+            text = page_text_cache.get(f"{base_url}|{page.id}|{page.version}")
+        if text is None:
+            missing.append(page)
+        else:
+            page.body_text = text
+    if missing:
+        try:
+            bodies = fetch_page_bodies(session, base_url, [page.id for page in missing], priority)
+        except (requests.exceptions.RequestException, RateLimitedError, AtlassianSearchError, ValueError) as e:
+            print(f"Confluence page bodies error: {e}")
+            bodies = {}
+        for page in missing:
+            if page.id not in bodies:
+                continue
+            version, text = bodies[page.id]
+            page.body_text = text
+            if version is not None:
+                page_text_cache.set(f"{base_url}|{page.id}|{version}", text)
+    record_stage('confluence_bodies', time.perf_counter() - started)
+    return pages
+
+# Optional local full-text index, synced in the background from one tenant.
+# Set LOCAL_INDEX_BASE_URL, LOCAL_INDEX_EMAIL and LOCAL_INDEX_TOKEN to enable it.
+LOCAL_INDEX_BASE_URL = os.environ.get('LOCAL_INDEX_BASE_URL', '').rstrip('/')
+LOCAL_INDEX_EMAIL = os.environ.get('LOCAL_INDEX_EMAIL', '')
+LOCAL_INDEX_TOKEN = os.environ.get('LOCAL_INDEX_TOKEN', '')
+LOCAL_INDEX_CREDENTIAL = credential_hash(LOCAL_INDEX_EMAIL, LOCAL_INDEX_TOKEN)
+LOCAL_INDEX_SHARED = os.environ.get('LOCAL_INDEX_SHARED', 'false').lower() in ('1', 'true', 'yes')
+LOCAL_INDEX_MAX_ITEMS = int(os.environ.get('LOCAL_INDEX_MAX_ITEMS', '100000'))
+local_index = None
+index_sync = None
+
+def local_index_session():
+    return session_pool.get(LOCAL_INDEX_BASE_URL, LOCAL_INDEX_EMAIL, LOCAL_INDEX_TOKEN)
+
+def fetch_index_issues(jql):
+    """Yield every issue matching jql, page by page"""
+    session = local_index_session()
+    payload = {'jql': jql, 'maxResults': PAGE_SIZE, 'fields': JIRA_FIELDS}
+    endpoint, jira_response = post_jira_search(session, LOCAL_INDEX_BASE_URL, payload, SYNC)
+    if jira_response.status_code != 200:
+        raise RuntimeError(f"Jira sync query failed: {jira_response.status_code} - {jira_response.text}")
+    # Issues are indexed with their raw ADF description, so nothing is projected away
+    data = parse_page(jira_response, 'issues')
+    # One issue past the limit tells a cut-off scan from one that fits exactly
+    pages = iter_jira_pages(
+        session, LOCAL_INDEX_BASE_URL, endpoint, payload, data, LOCAL_INDEX_MAX_ITEMS + 1, SYNC, strict=True
+    )
+    yield from limit_scan((issue for page in pages for issue in page), 'issues')
+
+def limit_scan(items, kind):
+    """Yield up to LOCAL_INDEX_MAX_ITEMS items, raising ScanTruncated if there are more"""
+    for count, item in enumerate(items):
+        if count == LOCAL_INDEX_MAX_ITEMS:
+            raise ScanTruncated(f"more than LOCAL_INDEX_MAX_ITEMS={LOCAL_INDEX_MAX_ITEMS} {kind} in scope")
+        yield item
+
+def fetch_index_pages(cql):
+    """Yield every page matching cql with its storage-format body, page by page"""
+    session = local_index_session()
+    status, data = fetch_page(
+        session, 'GET', f"{LOCAL_INDEX_BASE_URL}/wiki/rest/api/search", SYNC, 'results',
+        params={'cql': cql, 'limit': PAGE_SIZE, 'expand': 'content.body.storage'},
+        timeout=30
+    )
+    if status != 200:
+        raise RuntimeError(f"Confluence sync query failed: {status} - {data}")
+    pages = iter_confluence_pages(session, LOCAL_INDEX_BASE_URL, data, LOCAL_INDEX_MAX_ITEMS + 1, SYNC, strict=True)
+    yield from limit_scan((item for page in pages for item in page), 'pages')
+
+def start_local_index():
+    global local_index, index_sync
+    if not (LOCAL_INDEX_BASE_URL and LOCAL_INDEX_EMAIL and LOCAL_INDEX_TOKEN):
+        return
+    local_index = LocalIndex(os.environ.get('LOCAL_INDEX_PATH', 'atlassian_search_index.db'))
+    index_sync = IndexSync(
+        local_index,
+        fetch_index_issues,
+        fetch_index_pages,
+        jql_scope=os.environ.get('LOCAL_INDEX_JQL', 'updated >= -365d'),
+        cql_scope=os.environ.get('LOCAL_INDEX_CQL', 'type=page AND lastmodified >= now("-365d")'),
+        interval=float(os.environ.get('LOCAL_INDEX_SYNC_INTERVAL', '300')),
+        full_sync_interval=float(os.environ.get('LOCAL_INDEX_FULL_SYNC_INTERVAL', '86400'))
+    )
+    index_sync.start()
+
+start_local_index()
+
+SearchParams = namedtuple(
+    'SearchParams',
+    'email token base_url query max_total fields source page_bodies expand_depth read_cache write_cache cache_key'
+)
+
+def read_search_params(data):
+    """Parse a /search request body and Cache-Control header"""
+    email = data['email']
+    token = data['token']
+    base_url = data['baseUrl'].rstrip('/')
+    query = data['query']
+    # Results scanned per backend; more than one page switches on pagination
+    max_total = max(1, min(int(data.get('maxResults') or PAGE_SIZE), SEARCH_MAX_TOTAL))
+    
+    # Compact results by default; ?fields=a,b adds fields, ?fields=*all returns full objects
+    fields = parse_fields(request.args.get('fields'))
+    
+    # "source": "live" skips the local index
+    source = data.get('source', 'auto')
+    
+    # Body text for the top N Confluence pages
+    page_bodies = max(0, min(int(data.get('pageBodies', CONFLUENCE_BODY_PAGES) or 0), CONFLUENCE_TOP_K))
+    
+    # Levels of linked issues to add around the issue keys in the query
+    expand_depth = max(0, min(int(data.get('expand', ISSUE_GRAPH_DEPTH) or 0), ISSUE_GRAPH_MAX_DEPTH))
+    
+    if data.get('reprobe'):
+        jira_endpoints.forget(base_url)
+    
+    # Cache-Control: no-cache refreshes the cached entry, no-store bypasses the cache
+    read_cache, write_cache = parse_cache_control(request.headers.get('Cache-Control'))
+    cache_key = search_cache_key(
+        base_url, email, token, query,
+        f"max={max_total}|fields={fields_variant(fields)}|source={source}|bodies={page_bodies}|expand={expand_depth}"
+    )
+    return SearchParams(
+        email, token, base_url, query, max_total, fields, source, page_bodies, expand_depth,
+        read_cache, write_cache, cache_key
+    )
+
+def completed_future(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+def can_use_local_index(params):
+    """The index answers compact searches for its own tenant, once a full sync has finished
+
+    Unless LOCAL_INDEX_SHARED is set, only the credential that synced the index may read
+    it, so nobody sees issues their own permissions would hide.
+    """
+    if index_sync is None or params.source == 'live' or params.fields:
+        return False
+    plan = plan_query(params.query)
+    # The index has no issue links to expand
+    if params.expand_depth and plan.keys:
+        return False
+    # Its full-text search knows neither project:/space: filters nor keys among other words
+    # (only a lone key is looked up as one), so those queries go live
+    if plan.projects or plan.spaces:
+        return False
+    if plan.keys and (len(plan.keys) > 1 or plan.phrases or plan.terms):
+        return False
+    if params.base_url != LOCAL_INDEX_BASE_URL:
+        return False
+    if not LOCAL_INDEX_SHARED and credential_hash(params.email, params.token) != LOCAL_INDEX_CREDENTIAL:
+        return False
+    return index_sync.is_ready()
+
+# Identical searches arriving while one is running share its upstream fetch and ranking
+COALESCE_SEARCHES = os.environ.get('COALESCE_SEARCHES', 'true').lower() in ('1', 'true', 'yes')
+search_flights = SingleFlight()
+registry.callback(
+    'atlassian_search_coalesced_total', 'Searches that joined an identical one already in flight',
+    lambda: [({}, search_flights.stats()['joined'])], 'counter'
+)
+
+def start_search(params, priority=INTERACTIVE):
+    """Return the Jira and Confluence futures for a search, joining an identical one in flight
+
+    Searches are identical when tenant, credential, normalized query, options (the cache key)
+    and scheduler priority match; cache flags do not matter, since the result is the same.
+    """
+    if not COALESCE_SEARCHES:
+        return submit_search(params, priority)
+    futures, joined = search_flights.run((params.cache_key, priority), lambda: submit_search(params, priority))
+    if joined:
+        print(f"Joined in-flight search for {params.query!r}")
+    return futures
+
+def submit_search(params, priority=INTERACTIVE):
+    """Submit the Jira and Confluence searches and return their futures
+
+    Backends the local index can answer resolve immediately; the others go to the live APIs
+    at the given scheduler priority.
+    """
+    session = session_pool.get(params.base_url, params.email, params.token)
+    
+    jira_indexed = confluence_indexed = None
+    if can_use_local_index(params):
+        try:
+            started = time.perf_counter()
+            issues = [
+                IssueRecord.from_issue(issue, params.base_url)
+                for issue in local_index.search_issues(params.query, JIRA_TOP_K)
+            ]
+            pages = [
+                PageRecord.from_content(page, params.base_url)
+                for page in local_index.search_pages(params.query, CONFLUENCE_TOP_K)
+            ]
+            jira_indexed = rank_results(params.query, issues, issue_ranking_fields, JIRA_TOP_K)
+            confluence_indexed = rank_results(params.query, pages, page_ranking_fields, CONFLUENCE_TOP_K)
+            record_stage('local_index', time.perf_counter() - started)
+            print(f"Local index: {len(jira_indexed)} issues, {len(confluence_indexed)} pages for {params.query!r}")
+        except Exception as e:
+            print(f"Local index search error: {e}")
+    
+    # Query both backends at the same time - each keeps its own timeout,
+    # so the request takes as long as the slower search, not the sum
+    if jira_indexed:
+        jira_future = completed_future(jira_indexed)
+    else:
+        jira_future = metrics.submit(
+            search_executor, search_jira,
+            session, params.base_url, params.query, params.max_total, params.fields, priority, params.expand_depth
+        )
+    if confluence_indexed and params.page_bodies:
+        confluence_future = metrics.submit(
+            search_executor, attach_page_bodies, session, params.base_url, confluence_indexed, params.page_bodies, priority
+        )
+    elif confluence_indexed:
+        confluence_future = completed_future(confluence_indexed)
+    else:
+        confluence_future = metrics.submit(
+            search_executor, search_confluence,
+            session, params.base_url, params.query, params.max_total, params.fields, priority, params.page_bodies
+        )
+    return jira_future, confluence_future
+
+def store_results(params, jira_results, confluence_results):
+    """Cache a finished search and return the (projected) response body"""
+    results = {
+        'jira': project_issues(jira_results or []),
+        'confluence': project_pages(confluence_results or [])
+    }
+    # Both lists are scored on the same 0..1 scale, so they interleave into one ordering
+    results['merged'] = merge_rankings(
+        [('jira', issue.get('key'), issue.get('score') or 0) for issue in results['jira']],
+        [('confluence', page.get('id'), page.get('score') or 0) for page in results['confluence']]
+    )
+    
+    # Only cache complete answers, never a timed-out or failed backend
+    if params.write_cache and jira_results is not None and confluence_results is not None:
+        with stage('cache_write'):
+            search_cache.set(params.cache_key, results)
+    return results
+
+# Stale results are refreshed on a small pool of their own, one refresh per entry at a time
+REVALIDATE_WORKERS = int(os.environ.get('REVALIDATE_WORKERS', '2'))
+REVALIDATE_MAX_PENDING = int(os.environ.get('REVALIDATE_MAX_PENDING', '100'))
+revalidate_executor = ThreadPoolExecutor(max_workers=REVALIDATE_WORKERS, thread_name_prefix='atlassian-revalidate')
+revalidating = set()
+revalidating_lock = threading.Lock()
+
+def revalidate(params):
+    """Search again and replace a stale cache entry"""
+    try:
+        jira_future, confluence_future = start_search(params, BATCH)
+        store_results(params, jira_future.result(), confluence_future.result())
+    except Exception as e:
+        print(f"Refreshing cached search for {params.query!r} failed: {e}")
+    finally:
+        with revalidating_lock:
+            revalidating.discard(params.cache_key)
+
+def read_cached(params):
+    """Cached results and their age in seconds, or (None, None)
+
+    A result past its TTL but within SEARCH_CACHE_STALE_TTL is returned too, after queueing
+    a background refresh for it (unless one is queued already or the queue is full).
+    """
+    if not params.read_cache:
+        return None, None
+    with stage('cache_read'):
+        entry = search_cache.get_stale(params.cache_key)
+    if entry is None:
+        return None, None
+    results, age = entry
+    if age >= search_cache.ttl:
+        with revalidating_lock:
+            refresh = params.cache_key not in revalidating and len(revalidating) < REVALIDATE_MAX_PENDING
+            if refresh:
+                revalidating.add(params.cache_key)
+        if refresh:
+            print(f"Serving stale results for {params.query!r} ({age:.0f}s old), refreshing")
+            revalidate_executor.submit(revalidate, params)
+    return results, age
+
+def cache_status(age):
+    return 'HIT' if age < search_cache.ttl else 'STALE'
+
+def rate_limited_response(error):
+    """429 telling the client when the tenant expects to accept requests again"""
+    response = jsonify({'error': error.message, 'retryAfter': math.ceil(error.retry_after)})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(math.ceil(error.retry_after))
+    return response
 
 @app.route('/search', methods=['POST'])
 def search():
     try:
-        data = request.json
-        email = data['email']
-        token = data['token']
-        base_url = data['baseUrl'].rstrip('/')
-        query = data['query']
+        params = read_search_params(request.json)
+        
+        cached, age = read_cached(params)
+        if cached is not None:
+            with stage('serialize'):
+                response = jsonify(cached)
+            response.headers['X-Cache'] = cache_status(age)
+            response.headers['Age'] = str(int(age))
+            return response
         
-        auth = HTTPBasicAuth(email, token)
+        jira_future, confluence_future = start_search(params)
         
-        # Search Jira
-        jira_results = []
         try:
-            jira_url = f"{base_url}/rest/api/3/search"
-            
-            # Check if query looks like a ticket ID
-            is_ticket_id = '-' in query and any(char.isdigit() for char in query)
-            
-            if is_ticket_id:
-                jql_query = f'key = {query} OR key ~ {query}'
-            else:
-                words = query.split()
-                if len(words) > 1:
-                    word_queries = [f'text ~ "{word}"' for word in words]
-                    jql_query = ' AND '.join(word_queries)
-                else:
-                    jql_query = f'text ~ "{query}"'
-            
-            print(f"JQL Query: {jql_query}")
-            
-            jira_payload = {
-                'jql': jql_query,
-                'maxResults': 50,
-                'fields': ['summary', 'description', 'status', 'issuetype', 'priority', 'key']
-            }
+            jira_results = jira_future.result()
+            confluence_results = confluence_future.result()
+        except AtlassianAuthError as e:
+            confluence_future.cancel()
+            return jsonify({'error': e.message}), e.status_code
+        except RateLimitedError as e:
+            confluence_future.cancel()
+            return rate_limited_response(e)
+        
+        results = store_results(params, jira_results, confluence_results)
+        with stage('serialize'):
+            response = jsonify(results)
+        response.headers['X-Cache'] = 'MISS'
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def sse_event(event, payload):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+
+@app.route('/search/stream', methods=['POST'])
+def search_stream():
+    """Same search as /search, streamed as server-sent events
+
+    Emits a `jira` and a `confluence` event as soon as each backend is ranked (in
+    whichever order they finish), then `done` with the result counts, or `error`.
+    """
+    try:
+        params = read_search_params(request.json)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def generate():
+        cached, age = read_cached(params)
+        if cached is not None:
+            yield sse_event('jira', cached['jira'])
+            yield sse_event('confluence', cached['confluence'])
+            yield sse_event('done', {
+                'jira': len(cached['jira']), 'confluence': len(cached['confluence']),
+                'merged': cached.get('merged', []), 'cache': cache_status(age), 'age': int(age)
+            })
+            return
+        
+        jira_future, confluence_future = start_search(params)
+        backends = {jira_future: 'jira', confluence_future: 'confluence'}
+        results = {}
+        try:
+            project = {'jira': project_issues, 'confluence': project_pages}
+            for future in as_completed(backends):
+                name = backends[future]
+                try:
+                    results[name] = future.result()
+                except AtlassianAuthError as e:
+                    confluence_future.cancel()
+                    yield sse_event('error', {'error': e.message, 'status': e.status_code})
+                    return
+                except RateLimitedError as e:
+                    confluence_future.cancel()
+                    yield sse_event('error', {'error': e.message, 'status': 429, 'retryAfter': math.ceil(e.retry_after)})
+                    return
+                yield sse_event(name, project[name](results[name] or []))
             
-            jira_response = requests.post(
-                jira_url,
-                auth=auth,
-                json=jira_payload,
-                headers={'Accept': 'application/json', 'Content-Type': 'application/json'},
-                timeout=15
+            final = store_results(params, results['jira'], results['confluence'])
+            yield sse_event('done', {
+                'jira': len(final['jira']), 'confluence': len(final['confluence']),
+                'merged': final['merged'], 'cache': 'MISS'
+            })
+        except Exception as e:
+            yield sse_event('error', {'error': str(e), 'status': 500})
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # Stop reverse proxies from buffering the stream
+        'X-Accel-Buffering': 'no'
+    })
+
+# /search/batch: many queries per call on a bounded pool, at most BATCH_TENANT_CONCURRENCY
+# jobs per tenant at a time (shared by all batch requests in this process)
+BATCH_MAX_QUERIES = int(os.environ.get('BATCH_MAX_QUERIES', '500'))
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', '8'))
+BATCH_TENANT_CONCURRENCY = int(os.environ.get('BATCH_TENANT_CONCURRENCY', '4'))
+# Plain keyword queries sent together as one OR-ed JQL/CQL search (1 turns combining off)
+BATCH_COMBINE_SIZE = int(os.environ.get('BATCH_COMBINE_SIZE', '5'))
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='atlassian-batch')
+tenant_slots = {}
+tenant_slots_lock = threading.Lock()
+
+def tenant_slot(base_url):
+    """Semaphore limiting how many batch jobs run against one tenant at once"""
+    with tenant_slots_lock:
+        slot = tenant_slots.get(base_url)
+        if slot is None:
+            slot = tenant_slots[base_url] = threading.BoundedSemaphore(BATCH_TENANT_CONCURRENCY)
+        return slot
+
+def is_combinable(params):
+    """Compact keyword searches the local index cannot answer can share one OR-ed search"""
+    if params.fields != frozenset() or can_use_local_index(params):
+        return False
+    return plan_query(params.query).is_plain
+
+def run_search(params):
+    """One query of a batch, searched on its own; returns [(params, results, combined)]"""
+    jira_future, confluence_future = start_search(params, BATCH)
+    try:
+        jira_results = jira_future.result()
+    except (AtlassianAuthError, RateLimitedError):
+        confluence_future.cancel()
+        raise
+    confluence_results = confluence_future.result()
+    return [(params, store_results(params, jira_results, confluence_results), False)]
+
+def split_hits(query, hits, k):
+    """Rank the hits of a combined search that match query, or None if there are none"""
+    ranker = BM25Ranker(query, k)
+    for item, fields in hits:
+        if matches_terms(query, fields):
+            # Copied so each query keeps its own score on shared hits
+            ranker.add(item.copy(), fields)
+    if not len(ranker):
+        return None
+    return apply_scores(ranker.top(k))
+
+def run_combined_search(chunk):
+    """Several keyword queries as one OR-ed Jira and one OR-ed Confluence search
+
+    Hits are split back out per query with matches_terms and ranked with BM25 as usual.
+    A backend whose combined result hit max_total (so hits may be missing) or failed,
+    and queries left without hits (Atlassian also matches comments and stems words),
+    fall back to a search of their own for that backend.
+    """
+    first = chunk[0]
+    session = session_pool.get(first.base_url, first.email, first.token)
+    max_total = min(sum(params.max_total for params in chunk), SEARCH_MAX_TOTAL)
+    jql = ' OR '.join(f'({plan_query(params.query).jql})' for params in chunk)
+    cql = ' OR '.join(f'({plan_query(params.query).cql})' for params in chunk)
+    print(f"Combined search for {len(chunk)} queries: {jql}")
+    
+    jira_future = search_executor.submit(list, iter_jira_issues(session, first.base_url, jql, max_total, (), BATCH))
+    confluence_future = search_executor.submit(
+        list, iter_confluence_results(
+            session, first.base_url, cql, max_total, (), BATCH, with_version=any(params.page_bodies for params in chunk)
+        )
+    )
+    issue_hits = page_hits = None
+    try:
+        issues = jira_future.result()
+        if len(issues) < max_total:
+            issue_hits = [(issue, issue_ranking_fields(issue)) for issue in issues]
+    except (AtlassianAuthError, RateLimitedError):
+        confluence_future.cancel()
+        raise
+    except Exception as e:
+        print(f"Combined Jira search failed: {e}")
+    try:
+        pages = confluence_future.result()
+        if len(pages) < max_total:
+            page_hits = [(page, page_ranking_fields(page)) for page in pages]
+    except RateLimitedError:
+        raise
+    except Exception as e:
+        print(f"Combined Confluence search failed: {e}")
+    
+    results = []
+    for params in chunk:
+        jira_results = split_hits(params.query, issue_hits, JIRA_TOP_K) if issue_hits else None
+        split = jira_results is not None
+        if jira_results is None:
+            jira_results = search_jira(session, params.base_url, params.query, params.max_total, params.fields, BATCH)
+        confluence_results = split_hits(params.query, page_hits, CONFLUENCE_TOP_K) if page_hits else None
+        if confluence_results is None:
+            confluence_results = search_confluence(
+                session, params.base_url, params.query, params.max_total, params.fields, BATCH, params.page_bodies
             )
-            
-            # Fallback to /search/jql if standard endpoint is deprecated
-            if jira_response.status_code == 410:
-                print("Standard search deprecated, trying /search/jql endpoint...")
-                jira_url = f"{base_url}/rest/api/3/search/jql"
-                jira_response = requests.post(
-                    jira_url,
-                    auth=auth,
-                    json=jira_payload,
-                    headers={'Accept': 'application/json', 'Content-Type': 'application/json'},
-                    timeout=15
-                )
-            
-            if jira_response.status_code == 200:
-                jira_data = jira_response.json()
-                all_jira = jira_data.get('issues', [])
-                
-                # Rank results by relevance for non-ticket searches
-                if not is_ticket_id and all_jira:
-                    query_lower = query.lower()
-                    ranked_jira = []
-                    
-                    for issue in all_jira:
-                        summary = (issue['fields'].get('summary') or '').lower()
-                        
-                        # Handle description - extract text from ADF or use string
-                        desc_field = issue['fields'].get('description')
-                        if isinstance(desc_field, dict):
-                            description = extract_text_from_adf(desc_field).lower()
-                            # Store extracted text back for display
-                            issue['fields']['description_text'] = extract_text_from_adf(desc_field)
-                        elif isinstance(desc_field, str):
-                            description = desc_field.lower()
-                            issue['fields']['description_text'] = desc_field
-                        else:
-                            description = ''
-                            issue['fields']['description_text'] = ''
-                        
-                        score = 0
-                        if query_lower == summary:
-                            score = 100
-                        elif query_lower in summary:
-                            score = 90
-                        elif description and query_lower in description:
-                            score = 70
-                        elif all(word in summary or word in description for word in query_lower.split()):
-                            score = 50
-                        else:
-                            score = 30
-                        
-                        ranked_jira.append((score, issue))
-                    
-                    ranked_jira.sort(key=lambda x: x[0], reverse=True)
-                    jira_results = [r[1] for r in ranked_jira[:25]]
-                else:
-                    jira_results = all_jira
-                    
-            elif jira_response.status_code == 401:
-                return jsonify({'error': 'Authentication failed. Check your email and API token.'}), 401
-            elif jira_response.status_code == 403:
-                return jsonify({'error': 'Access denied. Check your permissions.'}), 403
+        else:
+            split = True
+            attach_page_bodies(session, params.base_url, confluence_results, params.page_bodies, BATCH)
+        if split:
+            # Split hits come from another candidate set than the query's own search, so they
+            # must not be cached under the key a plain /search reads
+            params = params._replace(write_cache=False)
+        results.append((params, store_results(params, jira_results, confluence_results), True))
+    return results
+
+def batch_jobs(queries):
+    """Split the uncached queries of a batch into (function, argument, queries) jobs"""
+    combinable = []
+    for params in queries:
+        if BATCH_COMBINE_SIZE > 1 and is_combinable(params):
+            combinable.append(params)
+        else:
+            yield run_search, params, [params]
+    for start in range(0, len(combinable), BATCH_COMBINE_SIZE):
+        chunk = combinable[start:start + BATCH_COMBINE_SIZE]
+        if len(chunk) == 1:
+            yield run_search, chunk[0], chunk
+        else:
+            yield run_combined_search, chunk, chunk
+
+def ndjson_line(payload):
+    return json.dumps(payload, separators=(',', ':')) + '\n'
+
+def batch_line(params, results, duplicates, cache, combined):
+    line = {'query': params.query, **results, 'cache': cache, 'combined': combined}
+    if duplicates:
+        line['duplicates'] = duplicates
+    return ndjson_line(line)
+
+@app.route('/search/batch', methods=['POST'])
+def search_batch():
+    """Run many searches in one call, streamed back as NDJSON
+
+    Body: email, token, baseUrl, queries (list) and the /search options. Queries that
+    normalize to the same text are searched once. Each query gets one line, in the order
+    they finish - {"query", "jira", "confluence", "merged", "cache", "combined"} or
+    {"query", "error"} - followed by a final {"done": true, ...} line. An authentication
+    failure is reported as {"error", "status"} and ends the stream.
+    """
+    try:
+        data = request.json
+        queries = data.get('queries')
+        if not isinstance(queries, list) or not queries or not all(isinstance(query, str) for query in queries):
+            return jsonify({'error': 'queries must be a non-empty list of strings'}), 400
+        if len(queries) > BATCH_MAX_QUERIES:
+            return jsonify({'error': f'At most {BATCH_MAX_QUERIES} queries per batch'}), 400
+        
+        unique = {}
+        duplicates = {}
+        for query in queries:
+            normalized = normalize_query(query)
+            if not normalized:
+                continue
+            if normalized in unique:
+                duplicates[normalized].append(query)
+                continue
+            unique[normalized] = read_search_params({**data, 'query': query})
+            duplicates[normalized] = []
+            # Drop the cached endpoint once for the batch, not once per query
+            data = {**data, 'reprobe': False}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def generate():
+        pending = []
+        for normalized, params in unique.items():
+            cached = search_cache.get(params.cache_key) if params.read_cache else None
+            if cached is not None:
+                yield batch_line(params, cached, duplicates[normalized], 'HIT', False)
             else:
-                print(f"Jira error: {jira_response.status_code} - {jira_response.text}")
-                
-        except requests.exceptions.Timeout:
-            print("Jira search timed out")
-        except Exception as e:
-            print(f"Jira search error: {e}")
+                pending.append(params)
         
-        # Search Confluence - use the search endpoint (same as UI)
-        confluence_results = []
+        jobs = batch_jobs(pending)
+        slot = tenant_slot(next(iter(unique.values())).base_url) if unique else None
+        running = {}  # future -> the queries it answers
+        combined = 0
+        exhausted = not pending
         try:
-            # Use the search endpoint that powers the UI search
-            confluence_url = f"{base_url}/wiki/rest/api/search"
-            
-            print(f"Confluence Search Query: {query}")
-            
-            confluence_params = {
-                'cql': f'type=page AND text ~ "{query}"',
-                'limit': 50
-            }
-            confluence_response = requests.get(confluence_url, auth=auth, params=confluence_params, timeout=15)
-            
-            if confluence_response.status_code == 200:
-                confluence_data = confluence_response.json()
-                search_results = confluence_data.get('results', [])
-                
-                # Extract content items from search results
-                all_results = []
-                for item in search_results:
-                    if 'content' in item:
-                        all_results.append(item['content'])
-                
-                # Simple ranking by title relevance
-                query_lower = query.lower()
-                ranked_results = []
-                
-                for result in all_results:
-                    title = result.get('title', '').lower()
-                    result_type = result.get('type', '')
-                    
-                    score = 0
-                    
-                    # Score based on title
-                    if query_lower in title:
-                        score = 100
-                    elif any(word in title for word in query_lower.split()):
-                        score = 70
-                    else:
-                        score = 50
-                    
-                    # Prefer pages
-                    if result_type == 'page':
-                        score += 10
-                    
-                    ranked_results.append((score, result))
-                
-                # Sort and return
-                ranked_results.sort(key=lambda x: x[0], reverse=True)
-                confluence_results = [r[1] for r in ranked_results[:50]]
-                
-        except requests.exceptions.Timeout:
-            print("Confluence search timed out")
-        except Exception as e:
-            print(f"Confluence search error: {e}")
+            while True:
+                # Start jobs while this tenant has free slots; only block for one when nothing is running
+                while not exhausted and slot.acquire(blocking=not running):
+                    job = next(jobs, None)
+                    if job is None:
+                        slot.release()
+                        exhausted = True
+                        break
+                    func, argument, job_queries = job
+                    combined += func is run_combined_search
+                    future = batch_executor.submit(func, argument)
+                    future.add_done_callback(lambda _: slot.release())
+                    running[future] = job_queries
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_queries = running.pop(future)
+                    try:
+                        for params, results, is_combined in future.result():
+                            yield batch_line(params, results, duplicates[normalize_query(params.query)], 'MISS', is_combined)
+                    except AtlassianAuthError as e:
+                        yield ndjson_line({'error': e.message, 'status': e.status_code})
+                        return
+                    except RateLimitedError as e:
+                        for params in job_queries:
+                            yield ndjson_line({
+                                'query': params.query, 'error': e.message,
+                                'status': 429, 'retryAfter': math.ceil(e.retry_after)
+                            })
+                    except Exception as e:
+                        for params in job_queries:
+                            yield ndjson_line({'query': params.query, 'error': str(e)})
+            yield ndjson_line({'done': True, 'queries': len(queries), 'unique': len(unique), 'combinedSearches': combined})
+        finally:
+            # Client went away or the batch was aborted - don't start what is still queued
+            for future in running:
+                future.cancel()
+    
+    return Response(generate(), mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+# Default size of the "Summary for Claude" prompt; callers may ask for up to SUMMARY_MAX_TOKENS_LIMIT
+SUMMARY_MAX_TOKENS = int(os.environ.get('SUMMARY_MAX_TOKENS', '12000'))
+SUMMARY_MAX_TOKENS_LIMIT = int(os.environ.get('SUMMARY_MAX_TOKENS_LIMIT', '100000'))
+
+@app.route('/summary', methods=['POST'])
+def summary():
+    """Build the test-case prompt from search results within a token budget
+
+    Body: query, jira, confluence (as returned by /search) and optionally maxTokens
+    or maxChars. With "stream": true the prompt is sent as chunked text/plain.
+    """
+    try:
+        data = request.json
+        if data.get('maxChars'):
+            max_chars = int(data['maxChars'])
+        else:
+            max_chars = int(data.get('maxTokens') or SUMMARY_MAX_TOKENS) * CHARS_PER_TOKEN
+        max_chars = min(max_chars, SUMMARY_MAX_TOKENS_LIMIT * CHARS_PER_TOKEN)
         
+        builder = PromptSummary(data.get('query', ''), data.get('jira') or [], data.get('confluence') or [], max_chars)
+        if max_chars < builder.min_chars:
+            return jsonify({'error': f'maxChars must be at least {builder.min_chars} for this query and result set'}), 400
+        if data.get('stream'):
+            return Response(iter(builder), mimetype='text/plain')
+        
+        text = builder.text()
         return jsonify({
-            'jira': jira_results,
-            'confluence': confluence_results
+            'summary': text,
+            'chars': len(text),
+            'estimatedTokens': estimate_tokens(text),
+            'truncated': builder.truncated,
+            'omitted': builder.omitted
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.before_request
+def start_timings():
+    current_timings.set(Timings())
+
+def time_first_chunk(chunks, started, endpoint):
+    """Yield a streamed body, observing the request time when its first chunk is ready"""
+    observed = False
+    try:
+        for chunk in chunks:
+            if not observed:
+                REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+                observed = True
+            yield chunk
+    finally:
+        if not observed:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+        # Closing the body runs its cleanup, e.g. cancelling what a batch has queued
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+# Registered before compress_response, so it runs after it and sees the final body size
+@app.after_request
+def record_request(response):
+    timings = current_timings.get()
+    if timings is None:
+        return response
+    endpoint = request.endpoint or 'none'
+    if response.is_streamed:
+        # The body is generated after this hook returns: time it to its first chunk. Its stages
+        # happen after the headers are sent, so streamed responses get no Server-Timing header
+        response.response = time_first_chunk(response.response, timings.started, endpoint)
+        return response
+    REQUEST_SECONDS.observe(time.perf_counter() - timings.started, endpoint=endpoint)
+    RESPONSE_BYTES.observe(response.calculate_content_length() or 0, endpoint=endpoint)
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = timings.header()
+    return response
+
+@app.after_request
+def compress_response(response):
+    """gzip/brotli-encode JSON responses for clients that accept it"""
+    if (not COMPRESS_RESPONSES or response.direct_passthrough or response.is_streamed
+            or response.mimetype != 'application/json' or 'Content-Encoding' in response.headers):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    if brotli is not None and 'br' in request.accept_encodings:
+        with stage('compress'):
+            response.set_data(brotli.compress(body, quality=4))
+        response.headers['Content-Encoding'] = 'br'
+    elif 'gzip' in request.accept_encodings:
+        with stage('compress'):
+            response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return response
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route('/index/status')
+def index_status():
+    if local_index is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, 'ready': index_sync.is_ready(), **local_index.stats()})
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify({
+        'search': search_cache.stats(), 'adf_text': adf_text_cache.stats(), 'page_text': page_text_cache.stats(),
+        'issue_graph': issue_graph_cache.stats(), 'in_flight': search_flights.stats()
+    })
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint (numbers are per worker process)"""
+    return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/rate-limit/stats')
+def rate_limit_stats():
+    return jsonify(request_scheduler.stats())
+
+def shutdown():
+    """Stop the search pools and close pooled sessions (gunicorn calls this as a worker exits)"""
+    for executor in (batch_executor, revalidate_executor, search_executor, prefetch_executor):
+        try:
+            executor.shutdown(wait=False, cancel_futures=True)
+        except TypeError:
+            # cancel_futures is Python 3.9+; older versions just stop taking new work
+            executor.shutdown(wait=False)
+    session_pool.close()
+
 if __name__ == '__main__':
     print("\n" + "="*70)
     print("🚀 Atlassian Search Tool (Free Version)")
@@ -683,6 +1572,8 @@ if __name__ == '__main__':
     print("3. Open http://localhost:5000 in your browser")
     print("4. Search for features, copy results, paste to Claude chat")
     print("5. Claude generates test cases for FREE!")
+    print("\n🏭 This is the development server. For production use:")
+    print("   pip install gunicorn gevent && gunicorn -c gunicorn.conf.py wsgi:app")
     print("\n💡 NO API KEY NEEDED - Use Claude chat for test generation!")
     print("="*70 + "\n")
     
@@ -0,0 +1,115 @@
+"""
+Search box input parsed into a typed query plan, compiled once to JQL and CQL
+Issue keys become exact lookups, project:/space: become filters, "quoted text" stays a phrase
+and every other word is a search term; values are escaped for the JQL/CQL strings they end up in
+"""
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+ISSUE_KEY = re.compile(r'^[A-Za-z][A-Za-z0-9_]*-\d+$')
+# project:ABC, project:ABC,XYZ and the same for space: (personal space keys start with ~)
+FILTER = re.compile(r'^(project|space)[:=](.+)$', re.IGNORECASE)
+FILTER_VALUE = re.compile(r'^~?[A-Za-z0-9_]+$')
+# A quoted phrase (an unclosed quote runs to the end) or a bare word
+TOKEN = re.compile(r'"([^"]*)"?|(\S+)')
+# Characters the Lucene query behind text ~ would otherwise interpret
+LUCENE_SPECIAL = re.compile(r'([+\-&|!(){}\[\]^"~*?:\\/])')
+
+# Issue keys are fetched with GET /issue/{key}, this many at a time
+KEY_LOOKUP_MAX = 10
+PLAN_CACHE_SIZE = 4096
+
+def quote(value):
+    """JQL/CQL string literal"""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def text_term(text):
+    """Right-hand side of text ~ for words matched individually"""
+    return quote(LUCENE_SPECIAL.sub(r'\\\1', text))
+
+def text_phrase(phrase):
+    """Right-hand side of text ~ for an exact phrase"""
+    return quote('"' + phrase.replace('\\', '\\\\').replace('"', '\\"') + '"')
+
+def build_jql(projects, phrases, terms):
+    """JQL for the Jira text search, or None if there is nothing to search for
+
+    The text parts must all match the issue text, within the project filters. Issue
+    keys are not part of it: they are looked up on their own, one request per key (see
+    QueryPlan.jql_with_words for keys no issue answers to).
+    """
+    clauses = [f'text ~ {text_phrase(phrase)}' for phrase in phrases]
+    clauses += [f'text ~ {text_term(term)}' for term in terms]
+    match = ' AND '.join(clauses)
+    if projects:
+        project_clause = f"project in ({', '.join(quote(project) for project in projects)})"
+        match = f'{project_clause} AND ({match})' if match else project_clause
+    return match or None
+
+def build_cql(keys, spaces, phrases, terms):
+    """CQL for the Confluence search, or None if there is no text to search for
+
+    Pages mention issue keys in their text, so keys are searched as words.
+    """
+    clauses = [f'text ~ {text_phrase(phrase)}' for phrase in phrases]
+    words = terms + keys
+    if words:
+        clauses.insert(0, f"text ~ {text_term(' '.join(words))}")
+    if not clauses:
+        return None
+    cql = ' AND '.join(clauses)
+    if spaces:
+        cql = f"space in ({', '.join(quote(space) for space in spaces)}) AND ({cql})"
+    return cql
+
+class QueryPlan(namedtuple('QueryPlan', 'keys projects spaces phrases terms jql cql')):
+    """Parsed query: each part is a tuple in input order without duplicates, plus the compiled JQL/CQL"""
+
+    __slots__ = ()
+
+    @property
+    def text(self):
+        """Free text of the query (phrases and terms), what results are ranked against"""
+        return ' '.join(self.phrases + self.terms)
+
+    def jql_with_words(self, words):
+        """The JQL with words (e.g. "keys" such as utf-8 that no issue has) searched as terms too"""
+        return build_jql(self.projects, self.phrases, self.terms + tuple(words))
+
+    @property
+    def is_plain(self):
+        """Only bare words - the kind of query several of which can share one OR-ed search"""
+        return bool(self.terms) and not (self.keys or self.projects or self.spaces or self.phrases)
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def plan_query(query):
+    """Parse a query and compile its JQL/CQL (cached, so repeated queries skip both steps)"""
+    parts = {'keys': [], 'projects': [], 'spaces': [], 'phrases': [], 'terms': []}
+
+    def add(kind, value):
+        if value and value not in parts[kind]:
+            parts[kind].append(value)
+
+    for match in TOKEN.finditer(query):
+        phrase, word = match.groups()
+        if phrase is not None:
+            add('phrases', ' '.join(phrase.split()))
+            continue
+        if ISSUE_KEY.match(word):
+            add('keys', word.upper())
+            continue
+        filter_match = FILTER.match(word)
+        values = filter_match and filter_match.group(2).split(',')
+        if values and all(FILTER_VALUE.match(value) for value in values):
+            kind = filter_match.group(1).lower()
+            for value in values:
+                add(f'{kind}s', value.upper() if kind == 'project' else value)
+            continue
+        add('terms', word)
+    keys, projects, spaces, phrases, terms = (tuple(parts[kind]) for kind in parts)
+    return QueryPlan(
+        keys, projects, spaces, phrases, terms,
+        build_jql(projects, phrases, terms), build_cql(keys, spaces, phrases, terms)
+    )
@@ -0,0 +1,196 @@
+"""
+Relevance ranking shared by the Jira and Confluence searches
+"""
+
+import heapq
+import math
+import re
+
+class TopK:
+    """Bounded min-heap that keeps the k highest-scoring items seen so far
+
+    Memory stays at k entries however many results stream through. Equal scores
+    keep their arrival order, matching a stable sort of the full list.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self._heap = []
+        self._seq = 0
+
+    def push(self, score, item):
+        # The sequence number breaks ties, so items themselves are never compared
+        entry = (score, -self._seq, item)
+        self._seq += 1
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry > self._heap[0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def items(self):
+        """Items ordered by descending score"""
+        return [entry[2] for entry in sorted(self._heap, key=lambda entry: entry[:2], reverse=True)]
+
+    def __len__(self):
+        return len(self._heap)
+
+TOKEN = re.compile(r'\w+')
+
+# BM25 parameters and field weights shared by Jira (summary/description) and Confluence (title/excerpt)
+K1 = 1.2
+B = 0.75
+FIELD_WEIGHTS = {'title': 3.0, 'body': 1.0}
+# Share of the final score given to the exact query phrase appearing in the title (or, at half, the body)
+PHRASE_WEIGHT = 0.2
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+def is_word_char(char):
+    return char.isalnum() or char == '_'
+
+# Candidate items kept per requested result when k is given; the extra room absorbs the
+# drift between scores computed with the statistics seen so far and the final ones
+CANDIDATE_FACTOR = 4
+
+class BM25Ranker:
+    """BM25F ranking over a candidate result set
+
+    add() lowercases each field once, counts whole-word occurrences of the query
+    terms and the field length, and keeps only those numbers per document. top()
+    computes IDF and average field lengths over everything added, normalizes each
+    score to 0..1 (the BM25 part by the sum of the query-term IDFs) so Jira and
+    Confluence results share one scale, and returns the best k.
+
+    With k, only the k * CANDIDATE_FACTOR best items so far (scored with the running
+    statistics, re-scored each time the document count doubles) are kept alive, and
+    top() re-scores those with the final statistics - memory stays at top-K however
+    many results are scanned. Without k every item is kept.
+    """
+
+    def __init__(self, query, k=None, field_weights=FIELD_WEIGHTS, k1=K1, b=B):
+        self.terms = list(dict.fromkeys(tokenize(query)))
+        # Patterns start with the literal term, so the regex engine can skip ahead to candidates
+        self._patterns = [re.compile(re.escape(term) + r'\b') for term in self.terms]
+        self.phrase = ' '.join(query.lower().split())
+        self.field_weights = field_weights
+        self.k1 = k1
+        self.b = b
+        self.pool = k * CANDIDATE_FACTOR if k else None
+        self._docs = []  # (term counts per field, field lengths, phrase hit) for every document
+        self._items = {}  # document index -> item, for the current candidates only
+        self._heap = []  # (running score, -document index) of the candidates, when pooled
+        self._rescore_at = 2 * self.pool if self.pool else None
+        self._df = dict.fromkeys(self.terms, 0)
+        self._length_totals = dict.fromkeys(field_weights, 0)
+
+    def _count(self, text, term, pattern):
+        """Whole-word occurrences of term in text"""
+        if term not in text:
+            return 0
+        count = 0
+        for match in pattern.finditer(text):
+            start = match.start()
+            if start == 0 or not is_word_char(text[start - 1]):
+                count += 1
+        return count
+
+    def add(self, item, fields):
+        """fields maps field name (see field_weights) to its text"""
+        counts = {}
+        lengths = {}
+        seen = set()
+        phrase_hit = 0.0
+        for name in self.field_weights:
+            text = (fields.get(name) or '').lower()
+            # Counting separators approximates the word count closely enough for length normalization
+            length = text.count(' ') + text.count('\n') + 1 if text else 0
+            lengths[name] = length
+            self._length_totals[name] += length
+            term_counts = [self._count(text, term, pattern) for term, pattern in zip(self.terms, self._patterns)]
+            counts[name] = term_counts
+            seen.update(term for term, count in zip(self.terms, term_counts) if count)
+            if self.phrase and self.phrase in text:
+                phrase_hit = max(phrase_hit, 1.0 if name == 'title' else 0.5)
+        for term in seen:
+            self._df[term] += 1
+        index = len(self._docs)
+        self._docs.append((counts, lengths, phrase_hit))
+        if self.pool is None:
+            self._items[index] = item
+            return
+
+        if len(self._heap) < self.pool:
+            entry = (self._score(index, self._statistics()), -index)
+            heapq.heappush(self._heap, entry)
+            self._items[index] = item
+        elif seen or phrase_hit:
+            # A document matching nothing scores 0 and can never displace a candidate
+            entry = (self._score(index, self._statistics()), -index)
+            if entry > self._heap[0]:
+                dropped = heapq.heapreplace(self._heap, entry)
+                del self._items[-dropped[1]]
+                self._items[index] = item
+        if len(self._docs) >= self._rescore_at:
+            self._rescore_at *= 2
+            statistics = self._statistics()
+            self._heap = [(self._score(-neg_index, statistics), neg_index) for _, neg_index in self._heap]
+            heapq.heapify(self._heap)
+
+    def _statistics(self):
+        """(IDF per term, normalizer, average field lengths) over the documents added so far"""
+        n = len(self._docs)
+        idf = [math.log(1 + (n - self._df[term] + 0.5) / (self._df[term] + 0.5)) for term in self.terms]
+        average = {name: (total / n) or 1.0 for name, total in self._length_totals.items()}
+        return idf, sum(idf) or 1.0, average
+
+    def _score(self, index, statistics):
+        idf, max_bm25, average = statistics
+        counts, lengths, phrase_hit = self._docs[index]
+        k1, b = self.k1, self.b
+        bm25 = 0.0
+        for i, term_idf in enumerate(idf):
+            # BM25F: length-normalize each field's term frequency, weight, then saturate once
+            tf = 0.0
+            for name, weight in self.field_weights.items():
+                count = counts[name][i]
+                if count:
+                    tf += weight * count / (1 - b + b * lengths[name] / average[name])
+            if tf:
+                bm25 += term_idf * tf / (k1 + tf)
+        return round((1 - PHRASE_WEIGHT) * bm25 / max_bm25 + PHRASE_WEIGHT * phrase_hit, 4)
+
+    def scored(self):
+        """(score, item) for every kept document, in the order they were added"""
+        if not self._docs:
+            return []
+        statistics = self._statistics()
+        return [(self._score(index, statistics), self._items[index]) for index in sorted(self._items)]
+
+    def top(self, k):
+        """The k best (score, item) pairs, best first"""
+        best = TopK(k)
+        for score, item in self.scored():
+            best.push(score, (score, item))
+        return best.items()
+
+    def __len__(self):
+        return len(self._docs)
+
+def matches_terms(query, fields):
+    """True when every query term starts a word in one of the fields
+
+    Used to split the hits of one OR-ed search back out per query. Prefix matching
+    keeps simple inflections ("login" finds "logins") that Atlassian's stemming would match.
+    """
+    text = ' '.join((value or '').lower() for value in fields.values())
+    return all(re.search(r'(?<!\w)' + re.escape(term), text) for term in tokenize(query))
+
+def merge_rankings(*ranked_lists):
+    """Merge already-scored result lists into one ordering, best first
+
+    Each list holds (source, id, score) tuples; ties keep source order.
+    """
+    merged = [entry for ranked in ranked_lists for entry in ranked]
+    merged.sort(key=lambda entry: entry[2], reverse=True)
+    return [{'source': source, 'id': item_id, 'score': score} for source, item_id, score in merged]
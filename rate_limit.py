@@ -0,0 +1,252 @@
+"""
+Rate-limit-aware scheduling of Atlassian API requests
+Each tenant gets a token bucket and a concurrency limit; 429/503 answers are retried
+after Retry-After (or a jittered exponential backoff), and interactive searches go first
+"""
+
+import heapq
+import itertools
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+# Lower value = served first when a tenant is at its limit
+INTERACTIVE = 0
+BATCH = 1
+SYNC = 2
+
+RETRY_STATUSES = (429, 503)
+
+class RateLimitedError(Exception):
+    """Raised when a tenant keeps answering 429 (or would make us wait longer than allowed)"""
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a Retry-After header (delay in seconds or an HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, moment.timestamp() - (now or time.time()))
+
+def parse_reset(value, now=None):
+    """Seconds until an X-RateLimit-Reset time (ISO 8601, epoch seconds or a delay), or None"""
+    if not value:
+        return None
+    now = now or time.time()
+    try:
+        number = float(value)
+        # Large numbers are epoch timestamps, small ones a delay
+        return max(0.0, number - now if number > 1e9 else number)
+    except ValueError:
+        pass
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, moment.timestamp() - now)
+
+def tenant_of(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+class TenantLimiter:
+    """Token bucket plus concurrency limit for one tenant, handed out in priority order
+
+    A request may start when it is the highest-priority waiter (FIFO within a priority),
+    fewer than max_concurrent requests are running, a token is available and the tenant
+    is not paused by a Retry-After or an exhausted X-RateLimit-Remaining.
+    """
+
+    def __init__(self, rate=10.0, burst=20, max_concurrent=8):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.tokens = float(burst)
+        self.paused_until = 0.0
+        self.active = 0
+        self.throttled = 0
+        self._updated = time.monotonic()
+        self._waiting = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority=INTERACTIVE, timeout=None):
+        """Wait for a slot and a token; returns False if timeout seconds pass first"""
+        entry = (priority, next(self._seq))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    delay = None
+                    if self._waiting[0] == entry and self.active < self.max_concurrent:
+                        delay = max(self.paused_until - now, (1 - self.tokens) / self.rate, 0.0)
+                        if delay == 0.0:
+                            heapq.heappop(self._waiting)
+                            self.tokens -= 1
+                            self.active += 1
+                            # The next waiter may be able to start too
+                            self._cond.notify_all()
+                            return True
+                    if deadline is not None:
+                        remaining = deadline - now
+                        # No point waiting out a pause that ends after the deadline
+                        if remaining <= 0 or self.paused_until > deadline:
+                            self._waiting.remove(entry)
+                            heapq.heapify(self._waiting)
+                            self._cond.notify_all()
+                            return False
+                        delay = remaining if delay is None else min(delay, remaining)
+                    self._cond.wait(delay)
+            except BaseException:
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                raise
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    def paused_for(self):
+        with self._cond:
+            return max(0.0, self.paused_until - time.monotonic())
+
+    def pause(self, seconds):
+        """Hold every request to this tenant for the next `seconds`"""
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def observe(self, response):
+        """Adjust to the rate-limit headers of a response; returns its Retry-After delay, if any"""
+        headers = response.headers
+        retry_after = parse_retry_after(headers.get('Retry-After'))
+        remaining = headers.get('X-RateLimit-Remaining')
+        with self._cond:
+            self._refill(time.monotonic())
+            if remaining is not None:
+                try:
+                    # Never spend more than the tenant says is left
+                    self.tokens = min(self.tokens, float(remaining))
+                except ValueError:
+                    remaining = None
+            if headers.get('X-RateLimit-NearLimit', '').lower() == 'true':
+                # Drop the burst allowance and continue at the steady rate
+                self.tokens = min(self.tokens, 0.0)
+            if response.status_code == 429:
+                self.throttled += 1
+        if remaining is not None and float(remaining) <= 0:
+            reset = parse_reset(headers.get('X-RateLimit-Reset'))
+            if reset is not None:
+                self.pause(reset)
+        if response.status_code in RETRY_STATUSES and retry_after is not None:
+            self.pause(retry_after)
+        return retry_after
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                'tokens': round(self.tokens, 2),
+                'active': self.active,
+                'waiting': len(self._waiting),
+                'paused_for': round(max(0.0, self.paused_until - now), 2),
+                'throttled': self.throttled
+            }
+
+class RequestScheduler:
+    """Sends Atlassian requests through a per-tenant TenantLimiter, retrying throttled ones
+
+    429 and 503 answers are retried up to max_retries times. The tenant is paused for
+    Retry-After when given, and each retry also waits a full-jitter exponential backoff
+    so throttled requests do not all return at once. A request that would have to wait
+    longer than max_wait raises RateLimitedError (503s are returned as-is instead).
+
+    observer(method, url, response, seconds) is called after every attempt (response is
+    None when the request raised).
+    """
+
+    def __init__(self, rate=10.0, burst=20, max_concurrent=8, max_retries=4,
+                 backoff_base=0.5, backoff_max=30.0, max_wait=60.0, observer=None):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_wait = max_wait
+        self.observer = observer
+        self._tenants = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, base_url):
+        with self._lock:
+            tenant = self._tenants.get(base_url)
+            if tenant is None:
+                tenant = self._tenants[base_url] = TenantLimiter(self.rate, self.burst, self.max_concurrent)
+            return tenant
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def send(self, session, method, url, priority=INTERACTIVE, **kwargs):
+        """session.request(method, url, **kwargs), scheduled and retried for this URL's tenant"""
+        tenant = self.limiter(tenant_of(url))
+        attempt = 0
+        while True:
+            if not tenant.acquire(priority, self.max_wait):
+                raise RateLimitedError(
+                    f"Rate limited by {tenant_of(url)}, gave up waiting", tenant.paused_for() or self.max_wait
+                )
+            started = time.perf_counter()
+            response = None
+            try:
+                response = session.request(method, url, **kwargs)
+            finally:
+                tenant.release()
+                if self.observer is not None:
+                    self.observer(method, url, response, time.perf_counter() - started)
+            retry_after = tenant.observe(response)
+            if response.status_code not in RETRY_STATUSES:
+                return response
+            delay = max(retry_after or 0.0, self.backoff(attempt))
+            if attempt >= self.max_retries or delay > self.max_wait:
+                if response.status_code == 429:
+                    response.close()
+                    raise RateLimitedError(f"Rate limited by {tenant_of(url)}", retry_after or delay)
+                return response
+            attempt += 1
+            # Release the connection of a streamed response we won't read
+            response.close()
+            print(f"{response.status_code} from {tenant_of(url)}, retry {attempt} in {delay:.1f}s")
+            time.sleep(delay)
+
+    def stats(self):
+        with self._lock:
+            tenants = dict(self._tenants)
+        return {base_url: tenant.stats() for base_url, tenant in tenants.items()}
@@ -0,0 +1,127 @@
+"""
+Compact records for search results on their way from parsing through ranking to the response
+A record keeps only what ranking and the /search schema read, so the nested API dicts
+can be dropped as soon as each result is parsed
+"""
+
+def field_name(value):
+    """Name of a status/issuetype/priority field"""
+    return value.get('name') if isinstance(value, dict) else None
+
+def kept_fields(source, extra):
+    """The fields named in extra (from ?fields=) that source has, or None"""
+    if not extra:
+        return None
+    return {name: source[name] for name in extra if name in source} or None
+
+def issue_links(fields):
+    """(key, relation) for each issue this one points at: issue links, sub-tasks and its parent
+
+    relation says what the other issue is to this one, e.g. "is blocked by" or "subtask of".
+    Empty unless the issue was fetched with the issuelinks/subtasks/parent fields.
+    """
+    links = []
+    for link in fields.get('issuelinks') or ():
+        link_type = link.get('type') or {}
+        if link.get('outwardIssue'):
+            links.append((link['outwardIssue'].get('key'), link_type.get('inward') or 'linked to'))
+        elif link.get('inwardIssue'):
+            links.append((link['inwardIssue'].get('key'), link_type.get('outward') or 'linked to'))
+    links += [(subtask.get('key'), 'subtask of') for subtask in fields.get('subtasks') or ()]
+    if (fields.get('parent') or {}).get('key'):
+        links.append((fields['parent']['key'], 'parent of'))
+    return tuple((key, relation) for key, relation in links if key)
+
+class IssueRecord:
+    """A Jira issue as ranked and returned by /search
+
+    extra holds the fields asked for with ?fields=, raw the whole issue for ?fields=*all.
+    links are the issue's (key, relation) edges for graph expansion, and linked says how an
+    issue found by expansion relates to the one it was reached from.
+    """
+
+    __slots__ = ('key', 'summary', 'description_text', 'status', 'issuetype', 'priority', 'url', 'score',
+                 'extra', 'raw', 'updated', 'links', 'linked')
+
+    def __init__(self, key, summary, description_text, status, issuetype, priority, url,
+                 score=None, extra=None, raw=None, updated=None, links=(), linked=None):
+        self.key = key
+        self.summary = summary
+        self.description_text = description_text
+        self.status = status
+        self.issuetype = issuetype
+        self.priority = priority
+        self.url = url
+        self.score = score
+        self.extra = extra
+        self.raw = raw
+        self.updated = updated
+        self.links = links
+        self.linked = linked
+
+    @classmethod
+    def from_issue(cls, issue, base_url, description_text=None, extra=frozenset()):
+        """Record from an API issue, or a local index document (which has description_text already)
+
+        extra=None keeps the whole issue for ?fields=*all.
+        """
+        fields = issue.get('fields') or {}
+        if description_text is None:
+            description_text = fields.get('description_text') or ''
+        key = issue.get('key')
+        return cls(
+            key, fields.get('summary') or '', description_text,
+            field_name(fields.get('status')), field_name(fields.get('issuetype')), field_name(fields.get('priority')),
+            f"{base_url}/browse/{key}",
+            extra=kept_fields(fields, extra), raw=issue if extra is None else None,
+            updated=fields.get('updated'), links=issue_links(fields)
+        )
+
+    def copy(self):
+        return IssueRecord(*self.dump())
+
+    def dump(self):
+        """Slot values as a JSON-friendly list (for caches)"""
+        return [getattr(self, name) for name in self.__slots__]
+
+    @classmethod
+    def load(cls, values):
+        """Record from a list made by dump()"""
+        return cls(*values)
+
+class PageRecord:
+    """A Confluence page as ranked and returned by /search
+
+    excerpt is the search excerpt (with its @@@hl@@@ markers), used as a stand-in for the body.
+    body_text is the page content as plain text, when it was fetched for the top pages.
+    """
+
+    __slots__ = ('id', 'title', 'type', 'url', 'excerpt', 'version', 'body_text', 'score', 'extra', 'raw')
+
+    def __init__(self, id, title, type, url, excerpt=None, version=None, body_text=None,
+                 score=None, extra=None, raw=None):
+        self.id = id
+        self.title = title
+        self.type = type
+        self.url = url
+        self.excerpt = excerpt
+        self.version = version
+        self.body_text = body_text
+        self.score = score
+        self.extra = extra
+        self.raw = raw
+
+    @classmethod
+    def from_content(cls, content, base_url, excerpt=None, extra=frozenset()):
+        """Record from a search result's content object, or a local index document"""
+        page_id = content.get('id')
+        webui = (content.get('_links') or {}).get('webui')
+        url = f"{base_url}/wiki{webui}" if webui else f"{base_url}/wiki/pages/viewpage.action?pageId={page_id}"
+        return cls(
+            page_id, content.get('title') or '', content.get('type'), url, excerpt,
+            (content.get('version') or {}).get('number'),
+            extra=kept_fields(content, extra), raw=content if extra is None else None
+        )
+
+    def copy(self):
+        return PageRecord(*(getattr(self, name) for name in self.__slots__))
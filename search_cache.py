@@ -0,0 +1,287 @@
+"""
+Caches for ranked /search results and extracted description text
+Pluggable backends: in-process memory (per worker) or a SQLite file shared by every worker on the host
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from session_pool import credential_hash
+
+def normalize_query(query):
+    """Lowercase and collapse whitespace so trivially different queries share an entry"""
+    return ' '.join(query.lower().split())
+
+def search_cache_key(base_url, email, token, query, variant=''):
+    """Cache key for a search; variant distinguishes options that change the result (e.g. page depth)"""
+    return f"{base_url}|{credential_hash(email, token)}|{normalize_query(query)}|{variant}"
+
+def parse_cache_control(header):
+    """Return (read, write) flags for a request Cache-Control header
+
+    no-store skips the cache entirely, no-cache (or max-age=0) refreshes the entry
+    """
+    directives = {part.strip().lower() for part in (header or '').split(',')}
+    if 'no-store' in directives:
+        return False, False
+    if 'no-cache' in directives or 'max-age=0' in directives:
+        return False, True
+    return True, True
+
+class MemoryCache:
+    """Thread-safe TTL + LRU cache bounded by the total size of the stored JSON
+
+    Entries are kept for stale_ttl seconds past their TTL, where only get_stale() returns them.
+    """
+
+    def __init__(self, ttl=300, max_bytes=64 * 1024 * 1024, stale_ttl=0):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()  # key -> (payload bytes, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached value or None"""
+        entry = self.get_stale(key, allow_stale=False)
+        return entry[0] if entry else None
+
+    def get_stale(self, key, allow_stale=True):
+        """Return (value, age in seconds) for a fresh entry, or one at most stale_ttl past its TTL, or None
+
+        The age counts from when the entry was written, so an age beyond ttl means it is stale.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            expires_in = entry[1] - now if entry is not None else 0
+            if entry is None or expires_in <= (-self.stale_ttl if allow_stale else 0):
+                if entry is not None and expires_in <= -self.stale_ttl:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if expires_in > 0:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            payload = entry[0]
+        # Stored as JSON so callers always get their own copy
+        return json.loads(payload), self.ttl - expires_in
+
+    def set(self, key, value, ttl=None):
+        payload = json.dumps(value, separators=(',', ':')).encode('utf-8')
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (payload, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self._bytes += len(payload)
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        payload, _ = self._entries.pop(key)
+        self._bytes -= len(payload)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._bytes = 0
+            elif key in self._entries:
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'backend': 'memory',
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'stale_ttl': self.stale_ttl,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+class SQLiteCache:
+    """TTL cache in a WAL-mode SQLite file, shared by all worker processes and kept across restarts
+
+    Expired rows are skipped on read (get_stale() still returns them for stale_ttl seconds) and
+    deleted by a background compaction thread, which also trims the namespace to max_bytes
+    (oldest entries first) and returns free pages to the OS.
+    """
+
+    def __init__(self, path, namespace, ttl=300, max_bytes=256 * 1024 * 1024, compact_interval=300, stale_ttl=0):
+        self.path = path
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.compact_interval = compact_interval
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._init_db()
+        if compact_interval:
+            thread = threading.Thread(target=self._compact_loop, name=f'cache-compact-{namespace}', daemon=True)
+            thread.start()
+
+    def _connect(self):
+        # sqlite3 connections are bound to the thread that created them
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            # Only takes effect on a new file, so it has to come before WAL mode creates it
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            ) WITHOUT ROWID
+        """)
+        conn.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (namespace, expires_at)')
+
+    def get(self, key):
+        entry = self.get_stale(key, allow_stale=False)
+        return entry[0] if entry else None
+
+    def get_stale(self, key, allow_stale=True):
+        """Return (value, age in seconds) for a fresh entry, or one at most stale_ttl past its TTL, or None"""
+        now = time.time()
+        row = self._connect().execute(
+            'SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?',
+            (self.namespace, key, now - (self.stale_ttl if allow_stale else 0))
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            if row[1] > now:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+        return json.loads(row[0]), self.ttl - (row[1] - now)
+
+    def set(self, key, value, ttl=None):
+        payload = json.dumps(value, separators=(',', ':')).encode('utf-8')
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        try:
+            self._connect().execute(
+                'INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)',
+                (self.namespace, key, payload, expires_at)
+            )
+        except sqlite3.OperationalError as e:
+            # A busy database must never fail the search itself
+            print(f"Cache write failed: {e}")
+
+    def invalidate(self, key=None):
+        conn = self._connect()
+        if key is None:
+            conn.execute('DELETE FROM cache WHERE namespace = ?', (self.namespace,))
+        else:
+            conn.execute('DELETE FROM cache WHERE namespace = ? AND key = ?', (self.namespace, key))
+
+    def compact(self):
+        """Delete expired rows, trim to max_bytes and reclaim free pages"""
+        conn = self._connect()
+        removed = conn.execute(
+            'DELETE FROM cache WHERE namespace = ? AND expires_at <= ?', (self.namespace, time.time() - self.stale_ttl)
+        ).rowcount
+        total = conn.execute(
+            'SELECT COALESCE(SUM(LENGTH(value)), 0) FROM cache WHERE namespace = ?', (self.namespace,)
+        ).fetchone()[0]
+        if total > self.max_bytes:
+            # Drop the entries closest to expiry (the oldest writes) until we fit
+            excess = total - self.max_bytes
+            rows = conn.execute(
+                'SELECT key, LENGTH(value) FROM cache WHERE namespace = ? ORDER BY expires_at', (self.namespace,)
+            ).fetchall()
+            doomed = []
+            for key, size in rows:
+                if excess <= 0:
+                    break
+                doomed.append((self.namespace, key))
+                excess -= size
+            conn.executemany('DELETE FROM cache WHERE namespace = ? AND key = ?', doomed)
+            with self._lock:
+                self.evictions += len(doomed)
+            removed += len(doomed)
+        conn.execute('PRAGMA incremental_vacuum').fetchall()
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return removed
+
+    def _compact_loop(self):
+        while True:
+            time.sleep(self.compact_interval)
+            try:
+                self.compact()
+            except sqlite3.Error as e:
+                print(f"Cache compaction failed: {e}")
+
+    def stats(self):
+        entries, size = self._connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM cache WHERE namespace = ? AND expires_at > ?',
+            (self.namespace, time.time())
+        ).fetchone()
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'backend': 'sqlite',
+                'path': self.path,
+                'entries': entries,
+                'bytes': size,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'stale_ttl': self.stale_ttl,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+def create_cache(namespace, ttl, max_bytes, backend=None, path=None, compact_interval=300, stale_ttl=0):
+    """Build the cache backend selected by CACHE_BACKEND (memory or sqlite)"""
+    backend = backend or os.environ.get('CACHE_BACKEND', 'memory')
+    if backend == 'sqlite':
+        path = path or os.environ.get('CACHE_SQLITE_PATH', 'atlassian_search_cache.db')
+        return SQLiteCache(
+            path, namespace, ttl=ttl, max_bytes=max_bytes, compact_interval=compact_interval, stale_ttl=stale_ttl
+        )
+    if backend != 'memory':
+        raise ValueError(f"Unknown cache backend: {backend}")
+    return MemoryCache(ttl=ttl, max_bytes=max_bytes, stale_ttl=stale_ttl)
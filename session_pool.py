@@ -0,0 +1,97 @@
+"""
+Pooled keep-alive HTTP sessions for Atlassian tenants
+One requests.Session per base URL + credential, so searches reuse warm TCP/TLS connections
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+
+def credential_hash(email, token):
+    """Stable, non-reversible fingerprint of an Atlassian credential"""
+    return hashlib.sha256(f"{email}:{token}".encode('utf-8')).hexdigest()
+
+class SessionPool:
+    """Thread-safe LRU pool of requests.Session objects keyed by tenant and credential
+
+    Sessions idle for idle_timeout are closed on the next get(), and every evict_interval
+    seconds by a background thread, so an idle worker does not hold their sockets open.
+    """
+
+    def __init__(self, max_sessions=32, pool_size=10, idle_timeout=300, evict_interval=60):
+        self.max_sessions = max_sessions
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.evict_interval = evict_interval
+        self._sessions = OrderedDict()  # key -> (session, last_used)
+        self._lock = threading.Lock()
+        if evict_interval:
+            thread = threading.Thread(target=self._evict_loop, name='session-evict', daemon=True)
+            thread.start()
+
+    def _new_session(self, email, token):
+        session = requests.Session()
+        session.auth = HTTPBasicAuth(email, token)
+        session.headers.update({'Accept': 'application/json'})
+        # Keep up to pool_size connections per host alive for the worker threads
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def get(self, base_url, email, token):
+        """Return the warm session for this tenant/credential, creating it if needed"""
+        key = (base_url, credential_hash(email, token))
+        now = time.monotonic()
+        stale = []
+        with self._lock:
+            stale = self._pop_idle(now)
+            entry = self._sessions.pop(key, None)
+            session = entry[0] if entry else self._new_session(email, token)
+            self._sessions[key] = (session, now)
+            while len(self._sessions) > self.max_sessions:
+                stale.append(self._sessions.popitem(last=False)[1][0])
+        for old in stale:
+            old.close()
+        return session
+
+    def _pop_idle(self, now):
+        # Entries are kept in last-used order, so idle ones are at the front
+        idle = []
+        while self._sessions:
+            key, (session, last_used) = next(iter(self._sessions.items()))
+            if now - last_used < self.idle_timeout:
+                break
+            del self._sessions[key]
+            idle.append(session)
+        return idle
+
+    def evict_idle(self):
+        """Close sessions that have not been used within idle_timeout"""
+        with self._lock:
+            idle = self._pop_idle(time.monotonic())
+        for session in idle:
+            session.close()
+        return len(idle)
+
+    def _evict_loop(self):
+        while True:
+            time.sleep(self.evict_interval)
+            self.evict_idle()
+
+    def close(self):
+        """Close every pooled session"""
+        with self._lock:
+            sessions = [entry[0] for entry in self._sessions.values()]
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
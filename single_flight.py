@@ -0,0 +1,70 @@
+"""
+Single-flight deduplication of in-flight work
+Callers asking for the same key while a call is still running share its futures instead of
+starting their own, so a burst of identical searches costs one upstream fetch and ranking pass
+"""
+
+import threading
+from concurrent.futures import Future
+
+class SingleFlight:
+    """Thread-safe registry of running calls keyed by what they compute
+
+    A call is a start() function returning a tuple of futures. The key is dropped once all
+    of them are done, so a later caller starts afresh (and reads the cache the call filled).
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> Future resolving to the call's futures
+        self._lock = threading.Lock()
+        self.started = 0
+        self.joined = 0
+
+    def run(self, key, start):
+        """Return (futures, joined): the running call's futures, or those of a new start()"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = Future()
+                self.started += 1
+                leader = True
+            else:
+                self.joined += 1
+                leader = False
+        if not leader:
+            return call.result(), True
+
+        # start() runs outside the lock; callers arriving meanwhile wait on call
+        try:
+            futures = start()
+        except BaseException as e:
+            self._forget(key, call)
+            call.set_exception(e)
+            raise
+        call.set_result(futures)
+        if not futures:
+            self._forget(key, call)
+            return futures, False
+
+        pending = [len(futures)]
+        pending_lock = threading.Lock()
+
+        def finished(_):
+            with pending_lock:
+                pending[0] -= 1
+                done = pending[0] == 0
+            if done:
+                self._forget(key, call)
+
+        for future in futures:
+            future.add_done_callback(finished)
+        return futures, False
+
+    def _forget(self, key, call):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+    def stats(self):
+        with self._lock:
+            return {'in_flight': len(self._calls), 'started': self.started, 'joined': self.joined}
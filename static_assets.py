@@ -0,0 +1,90 @@
+"""
+The web UI as precompiled static assets
+ui/index.html, app.css and app.js are read and compressed once, on first use. The CSS and
+JS are served under content-hashed names that browsers may cache for a year; the page
+itself is revalidated with its ETag, so repeat loads are answered with 304.
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+UI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ui')
+ASSET_PREFIX = '/assets/'
+# Hashed names never change content, so browsers need not even revalidate them
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+class Asset:
+    """One file kept in memory in every encoding that makes it smaller"""
+
+    def __init__(self, body, mimetype, cache_control, modified):
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.modified = modified
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.encoded = {'identity': body}
+        compressed = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed['br'] = brotli.compress(body, quality=11)
+        for encoding, data in compressed.items():
+            if len(data) < len(body):
+                self.encoded[encoding] = data
+
+    def encoding_for(self, accept_encodings):
+        """Best stored encoding the client accepts (brotli, then gzip)"""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.encoded and encoding in accept_encodings:
+                return encoding
+        return 'identity'
+
+class UIAssets:
+    """index.html plus its hashed CSS/JS, built on first use
+
+    index.html refers to the stylesheet and script as {{ app_css }} and {{ app_js }};
+    those placeholders are replaced with the hashed asset URLs.
+    """
+
+    def __init__(self, directory=UI_DIR):
+        self.directory = directory
+        self._assets = None
+        self._lock = threading.Lock()
+
+    def _read(self, name):
+        path = os.path.join(self.directory, name)
+        with open(path, 'rb') as f:
+            return f.read(), os.path.getmtime(path)
+
+    def _build(self):
+        assets = {}
+        urls = {}
+        latest = 0.0
+        for name, placeholder, mimetype in (('app.css', 'app_css', 'text/css'),
+                                            ('app.js', 'app_js', 'text/javascript')):
+            body, modified = self._read(name)
+            latest = max(latest, modified)
+            asset = Asset(body, mimetype, IMMUTABLE, modified)
+            stem, extension = os.path.splitext(name)
+            hashed = f"{stem}.{asset.digest[:12]}{extension}"
+            assets[hashed] = asset
+            urls[placeholder] = ASSET_PREFIX + hashed
+        page, modified = self._read('index.html')
+        for placeholder, url in urls.items():
+            page = page.replace(f'{{{{ {placeholder} }}}}'.encode(), url.encode())
+        # The page changes whenever one of its assets does
+        assets['index.html'] = Asset(page, 'text/html', REVALIDATE, max(latest, modified))
+        return assets
+
+    def get(self, name):
+        """The asset with this (hashed) name, or None"""
+        if self._assets is None:
+            with self._lock:
+                if self._assets is None:
+                    self._assets = self._build()
+        return self._assets.get(name)
@@ -0,0 +1,132 @@
+"""
+Incremental parsing of large Jira/Confluence search responses
+Each item of the result array (issues[] / results[]) is parsed and projected on its
+own while the body streams in, so a page never exists as one large dict
+"""
+
+import codecs
+import json
+import re
+
+CHUNK_SIZE = 64 * 1024
+
+# A complete string (group 1 set when it is an object key), a bracket, or a lone quote:
+# the start of a string cut off by the end of the buffer
+TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"(\s*:)?|[\[\]{}]|"', re.DOTALL)
+SEPARATOR = re.compile(r'[\s,]*')
+# What may follow a complete array item
+ITEM_END = ' \t\r\n,]'
+
+class ArraySplitter:
+    """Cuts the items of one top-level array out of a JSON object fed in chunks
+
+    feed() returns each item completed so far, parsed by the C decoder straight from the
+    buffer; only the item being read is held as text. Everything outside the array
+    (paging fields, _links) is kept and parsed by envelope(), with the array left empty.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._depth = 0
+        self._last_key = None
+        self._in_array = False
+        self._retry_at = 0
+        self._envelope = []
+        self._copied = 0
+
+    def feed(self, chunk, final=False):
+        buffer = self._buffer + self._text.decode(chunk, final)
+        items = []
+        pos = 0
+        while True:
+            if self._in_array:
+                pos = SEPARATOR.match(buffer, pos).end()
+                if pos == len(buffer):
+                    break
+                if buffer[pos] == ']':
+                    self._in_array = False
+                    self._depth = 1
+                    self._copied = pos
+                    pos += 1
+                    continue
+                if len(buffer) < self._retry_at and not final:
+                    break
+                try:
+                    item, end = self._decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    # Cut off by the end of the buffer; wait until it has doubled so a
+                    # large item is not re-parsed for every chunk
+                    self._retry_at = pos + 2 * (len(buffer) - pos)
+                    break
+                if (not final and not isinstance(item, (dict, list, str))
+                        and (end == len(buffer) or buffer[end] not in ITEM_END)):
+                    # A number may go on in the next chunk ("12" + "3", "1." + "5")
+                    break
+                self._retry_at = 0
+                items.append(item)
+                pos = end
+                continue
+
+            match = TOKEN.search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break
+            token = match.group()
+            first = token[0]
+            if first == '"':
+                if token == '"' and not final:
+                    # Unterminated string - wait for the rest
+                    pos = match.start()
+                    break
+                if self._depth == 1:
+                    if match.group(1) is None and not final and not buffer[match.end():].strip():
+                        # Can't tell yet whether a ':' follows
+                        pos = match.start()
+                        break
+                    if match.group(1) is not None:
+                        self._last_key = token[1:len(token) - len(match.group(1)) - 1]
+            elif first in '{[':
+                if self._depth == 1 and first == '[' and self._last_key == self.key:
+                    self._in_array = True
+                    self._envelope.append(buffer[self._copied:match.end()])
+                self._depth += 1
+            else:
+                self._depth -= 1
+            pos = match.end()
+
+        # Drop what has been consumed; keep the item being read, or the unsaved envelope bytes
+        if not self._in_array:
+            self._envelope.append(buffer[self._copied:pos])
+        if self._retry_at:
+            self._retry_at -= pos
+        self._buffer = buffer[pos:]
+        self._copied = 0
+        return items
+
+    def envelope(self):
+        return json.loads(''.join(self._envelope) + self._buffer)
+
+def parse_page(response, key, project=None, chunk_size=CHUNK_SIZE):
+    """Parse a search response (ideally requested with stream=True) like response.json()
+
+    project(item) runs on each item of data[key] as soon as it is parsed, so fields
+    nobody ranks or renders are dropped before the next item is read.
+    """
+    splitter = ArraySplitter(key)
+    items = []
+    try:
+        for chunk in response.iter_content(chunk_size):
+            for item in splitter.feed(chunk):
+                items.append(project(item) if project else item)
+        for item in splitter.feed(b'', final=True):
+            items.append(project(item) if project else item)
+    finally:
+        response.close()
+    data = splitter.envelope()
+    data[key] = items
+    return data
@@ -0,0 +1,241 @@
+"""
+Builds the "Summary for Claude" prompt from ranked search results
+Keeps the prompt within a character budget: tickets (and pages with body text) get description
+space by relevance, texts are trimmed at sentence boundaries and near-duplicate sentences are dropped.
+"""
+
+import re
+
+# Rough size of an English token for Claude-style tokenizers
+CHARS_PER_TOKEN = 4
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+WORD = re.compile(r'\w+')
+ELLIPSIS = ' …'
+REPEATED = '(same as a ticket above)'
+NO_DESCRIPTION = 'No description'
+
+FOOTER = (
+    "\nPlease generate comprehensive test cases including:\n"
+    "1. Test case ID and title\n"
+    "2. Preconditions\n"
+    "3. Test steps (numbered)\n"
+    "4. Expected results\n"
+    "5. Priority level\n"
+    "6. Both positive and negative test scenarios\n"
+    "7. Edge cases\n"
+)
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def name_of(value, default):
+    """status/issuetype/priority objects are rendered by name"""
+    if isinstance(value, dict) and value.get('name'):
+        return value['name']
+    return default
+
+def split_sentences(text):
+    return [sentence for sentence in SENTENCE_END.split(' '.join(text.split())) if sentence]
+
+def relevance_weights(items):
+    """Use result scores when every item has one, otherwise fall back to rank order"""
+    scores = [item.get('score') for item in items]
+    if scores and all(isinstance(score, (int, float)) and score > 0 for score in scores):
+        return scores
+    return [1 / (rank + 1) for rank in range(len(items))]
+
+def allocate(budget, weights, demands):
+    """Split budget by weight, handing what short descriptions don't need to the others"""
+    alloc = [0] * len(demands)
+    active = {i for i, demand in enumerate(demands) if demand > 0}
+    while active and budget > 0:
+        total_weight = sum(weights[i] for i in active)
+        share = {i: budget * weights[i] / total_weight for i in active}
+        satisfied = [i for i in active if demands[i] - alloc[i] <= share[i]]
+        if not satisfied:
+            for i in active:
+                alloc[i] += int(share[i])
+            break
+        for i in satisfied:
+            budget -= demands[i] - alloc[i]
+            alloc[i] = demands[i]
+            active.discard(i)
+    return alloc
+
+def trim_sentences(sentences, limit):
+    """Longest prefix of whole sentences within limit characters"""
+    text = ' '.join(sentences)
+    if len(text) <= limit:
+        return text
+    limit -= len(ELLIPSIS)
+    kept = []
+    size = 0
+    for sentence in sentences:
+        extra = len(sentence) + (1 if kept else 0)
+        if size + extra > limit:
+            break
+        kept.append(sentence)
+        size += extra
+    if not kept:
+        # Not even one sentence fits - cut the first one at a word boundary
+        if limit < 20:
+            return ''
+        return sentences[0][:limit].rsplit(' ', 1)[0] + ELLIPSIS
+    return ' '.join(kept) + ELLIPSIS
+
+class SentenceDeduper:
+    """Drops sentences that repeat (or nearly repeat) one already kept
+
+    Sentences are compared as word sets; Jaccard similarity at or above threshold
+    counts as a duplicate. Only sentences of similar length can reach the
+    threshold, so each comparison is skipped unless the sizes are close.
+    """
+
+    def __init__(self, threshold=0.85):
+        self.threshold = threshold
+        self._exact = set()
+        self._seen = []
+
+    def is_duplicate(self, sentence):
+        words = frozenset(WORD.findall(sentence.lower()))
+        if not words:
+            return False
+        if words in self._exact:
+            return True
+        size = len(words)
+        for seen in self._seen:
+            smaller, larger = sorted((size, len(seen)))
+            if smaller < self.threshold * larger:
+                continue
+            if len(words & seen) / len(words | seen) >= self.threshold:
+                return True
+        self._exact.add(words)
+        self._seen.append(words)
+        return False
+
+class PromptSummary:
+    """Test-case prompt for a search, built within max_chars
+
+    Iterate to stream the prompt chunk by chunk, or call text(). After a full
+    pass, `truncated` and `omitted` describe what did not fit.
+    """
+
+    def __init__(self, query, jira, confluence, max_chars, dedupe_threshold=0.85):
+        self.query = query
+        self.jira = jira
+        self.confluence = confluence
+        self.max_chars = max_chars
+        self.dedupe_threshold = dedupe_threshold
+        self.truncated = False
+        self.omitted = {'jira': 0, 'confluence': 0}
+
+    def _ticket_block(self, issue, description):
+        fields = issue.get('fields', {})
+        linked = issue.get('linked')
+        linked_line = f"Linked: {linked.get('relation')} {linked.get('from')}\n" if linked else ''
+        return (
+            f"Ticket: {issue.get('key')}\n"
+            f"{linked_line}"
+            f"Summary: {fields.get('summary') or 'No summary'}\n"
+            f"Description: {description or NO_DESCRIPTION}\n"
+            f"Status: {name_of(fields.get('status'), 'Unknown')}\n"
+            f"Type: {name_of(fields.get('issuetype'), 'Unknown')}\n"
+            f"Priority: {name_of(fields.get('priority'), 'Not set')}\n"
+            f"\n---\n\n"
+        )
+
+    def _page_block(self, page, content=''):
+        content_line = f"Content: {content}\n" if content else ''
+        return f"Page: {page.get('title')}\nType: {page.get('type')}\n{content_line}\n---\n\n"
+
+    def _section(self, title, shown, found):
+        count = f"{found} found" if shown == found else f"{found} found, top {shown} included"
+        return f"=== {title} ({count}) ===\n\n"
+
+    def _header(self):
+        return (
+            f'I searched my Atlassian instance for "{self.query}" and found the following information. '
+            f'Please generate comprehensive test cases based on this:\n\n'
+        )
+
+    @property
+    def min_chars(self):
+        """Size of the parts every prompt has (header, section titles, footer) - the smallest max_chars"""
+        return (len(self._header()) + len(FOOTER) + 1 + len(self._section('JIRA TICKETS', 0, len(self.jira)))
+                + len(self._section('CONFLUENCE PAGES', 0, len(self.confluence))))
+
+    def __iter__(self):
+        header = self._header()
+        budget = self.max_chars - self.min_chars
+
+        # Ticket metadata first, in rank order, then page titles with what is left.
+        # Up to a quarter of the budget is held back so tickets cannot crowd out every page.
+        page_reserve = min(sum(len(self._page_block(page)) for page in self.confluence), budget // 4)
+        budget -= page_reserve
+        tickets = []
+        for issue in self.jira:
+            size = len(self._ticket_block(issue, ''))
+            if size > budget:
+                break
+            budget -= size
+            tickets.append(issue)
+        budget += page_reserve
+        pages = []
+        for page in self.confluence:
+            size = len(self._page_block(page))
+            if size > budget:
+                break
+            budget -= size
+            pages.append(page)
+        self.omitted = {'jira': len(self.jira) - len(tickets), 'confluence': len(self.confluence) - len(pages)}
+        self.truncated = any(self.omitted.values())
+
+        # Higher-ranked tickets keep a shared sentence; lower ones drop their copy.
+        # Page bodies (when /search fetched them) come after the tickets.
+        deduper = SentenceDeduper(self.dedupe_threshold)
+        descriptions = []
+        repeated = []
+        for issue in tickets:
+            sentences = split_sentences(issue.get('fields', {}).get('description_text') or '')
+            unique = [sentence for sentence in sentences if not deduper.is_duplicate(sentence)]
+            descriptions.append(unique)
+            repeated.append(bool(sentences) and not unique)
+        contents = []
+        for page in pages:
+            sentences = split_sentences(page.get('body_text') or '')
+            contents.append([sentence for sentence in sentences if not deduper.is_duplicate(sentence)])
+        # The repeat marker is longer than the "No description" the ticket was measured with;
+        # if that does not fit, the ticket just shows an ellipsis
+        marker_cost = sum(repeated) * (len(REPEATED) - len(NO_DESCRIPTION))
+        if marker_cost > budget:
+            repeated = [False] * len(repeated)
+        else:
+            budget -= marker_cost
+        # A page's content also costs its "Content: " line
+        overhead = len(self._page_block({}, 'x')) - len(self._page_block({})) - 1
+        demands = [len(' '.join(sentences)) for sentences in descriptions]
+        demands += [len(' '.join(sentences)) + overhead if sentences else 0 for sentences in contents]
+        allowance = allocate(max(budget, 0), relevance_weights(tickets) + relevance_weights(pages), demands)
+        page_allowance = allowance[len(tickets):]
+
+        yield header
+        yield self._section('JIRA TICKETS', len(tickets), len(self.jira))
+        for issue, sentences, limit, is_repeat in zip(tickets, descriptions, allowance, repeated):
+            description = trim_sentences(sentences, limit)
+            if is_repeat:
+                description = REPEATED
+            elif len(description) < len(' '.join(sentences)):
+                self.truncated = True
+                description = description or ELLIPSIS.strip()
+            yield self._ticket_block(issue, description)
+        yield '\n' + self._section('CONFLUENCE PAGES', len(pages), len(self.confluence))
+        for page, sentences, limit in zip(pages, contents, page_allowance):
+            content = trim_sentences(sentences, limit - overhead) if limit > overhead else ''
+            if len(content) < len(' '.join(sentences)):
+                self.truncated = True
+            yield self._page_block(page, content)
+        yield FOOTER
+
+    def text(self):
+        return ''.join(self)
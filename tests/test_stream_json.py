@@ -0,0 +1,80 @@
+"""
+ArraySplitter against json.loads, with the document cut into chunks at every kind of boundary
+
+    python -m unittest discover tests
+"""
+
+import json
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stream_json import ArraySplitter
+
+def split_parse(document, key, chunk_sizes):
+    """Feed document (bytes) in chunks of the given sizes, cycling; return (items, envelope)"""
+    splitter = ArraySplitter(key)
+    items = []
+    pos = 0
+    for size in chunk_sizes:
+        if pos >= len(document):
+            break
+        items += splitter.feed(document[pos:pos + size])
+        pos += size
+    items += splitter.feed(document[pos:], final=True)
+    return items, splitter.envelope()
+
+def random_value(rng, depth=0):
+    kind = rng.choice(['int', 'float', 'str', 'bool', 'null'] + (['list', 'dict'] if depth < 3 else []))
+    if kind == 'int':
+        return rng.randint(-10 ** 6, 10 ** 6)
+    if kind == 'float':
+        return rng.uniform(-1e6, 1e6)
+    if kind == 'str':
+        return ''.join(rng.choice('ab "\\/\n\té€😀[]{},:') for _ in range(rng.randint(0, 12)))
+    if kind == 'bool':
+        return rng.random() < 0.5
+    if kind == 'null':
+        return None
+    if kind == 'list':
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    return {f"k{i}": random_value(rng, depth + 1) for i in range(rng.randint(0, 4))}
+
+class ArraySplitterTest(unittest.TestCase):
+
+    def check(self, data, key, chunk_sizes):
+        document = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        items, envelope = split_parse(document, key, chunk_sizes)
+        self.assertEqual(items, data[key])
+        self.assertEqual(envelope, {**data, key: []})
+
+    def test_every_chunk_size(self):
+        data = {'startAt': 0, 'issues': [{'key': 'CD-1', 'fields': {'summary': 'Ünïcode "quoted" [x]'}}, {'key': 'CD-2'}],
+                'total': 2, '_links': {'next': '/x?cursor=a,b'}}
+        for size in range(1, 40):
+            self.check(data, 'issues', [size])
+
+    def test_scalar_items_cut_by_a_chunk(self):
+        for document in (b'{"issues":[123', b'{"issues":[1.', b'{"issues":[1e', b'{"issues":[-'):
+            splitter = ArraySplitter('issues')
+            self.assertEqual(splitter.feed(document), [])
+        self.assertEqual(split_parse(b'{"issues":[12345,1.5e3,-7,true,null,"s"]}', 'issues', [14, 3, 2])[0],
+                         [12345, 1.5e3, -7, True, None, 's'])
+
+    def test_key_elsewhere_is_not_split(self):
+        data = {'meta': {'issues': [1, 2]}, 'issues': [[3], {'issues': [4]}]}
+        for size in (1, 2, 5, 7):
+            self.check(data, 'issues', [size])
+
+    def test_random_documents(self):
+        rng = random.Random(7)
+        for _ in range(300):
+            data = {'before': random_value(rng), 'results': [random_value(rng) for _ in range(rng.randint(0, 8))],
+                    'after': random_value(rng)}
+            self.check(data, 'results', [rng.randint(1, 16) for _ in range(64)])
+
+if __name__ == '__main__':
+    unittest.main()
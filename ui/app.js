@@ -0,0 +1,201 @@
+let searchResults = null;
+
+function showError(msg) {
+    document.getElementById('errorMsg').textContent = msg;
+    document.getElementById('errorMsg').style.display = 'block';
+    document.getElementById('successMsg').style.display = 'none';
+}
+
+function showSuccess(msg) {
+    document.getElementById('successMsg').textContent = msg;
+    document.getElementById('successMsg').style.display = 'block';
+    document.getElementById('errorMsg').style.display = 'none';
+}
+
+function hideMessages() {
+    document.getElementById('errorMsg').style.display = 'none';
+    document.getElementById('successMsg').style.display = 'none';
+}
+
+async function searchAtlassian() {
+    const email = document.getElementById('email').value;
+    const token = document.getElementById('token').value;
+    const baseUrl = document.getElementById('baseUrl').value;
+    const query = document.getElementById('searchQuery').value;
+
+    if (!email || !token || !query) {
+        showError('Please fill in all fields');
+        return;
+    }
+
+    hideMessages();
+    const searchBtn = document.getElementById('searchBtn');
+    searchBtn.disabled = true;
+    searchBtn.innerHTML = '<span class="spinner"></span>Searching...';
+
+    // Results arrive per backend, so render each list as soon as its event lands
+    const data = { jira: null, confluence: null };
+    document.getElementById('jiraCount').textContent = '…';
+    document.getElementById('confluenceCount').textContent = '…';
+    document.getElementById('jiraResults').innerHTML = '<p><span class="spinner"></span>Searching Jira...</p>';
+    document.getElementById('confluenceResults').innerHTML = '<p><span class="spinner"></span>Searching Confluence...</p>';
+    document.getElementById('summaryText').value = '';
+    document.getElementById('results').style.display = 'block';
+
+    try {
+        const response = await fetch('/search/stream', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({ email, token, baseUrl, query })
+        });
+
+        if (!response.ok) {
+            const err = await response.json();
+            showError(err.error || 'Search failed');
+            return;
+        }
+
+        await readEvents(response, (event, payload) => {
+            if (event === 'jira') {
+                data.jira = payload;
+                displayJira(payload);
+            } else if (event === 'confluence') {
+                data.confluence = payload;
+                displayConfluence(payload);
+            } else if (event === 'error') {
+                throw new Error(payload.error);
+            } else if (event === 'done') {
+                searchResults = data;
+                generateSummary(query, data);
+                showSuccess(`Found ${data.jira.length} Jira tickets and ${data.confluence.length} Confluence pages! Now copy the summary and paste it to Claude.`);
+            }
+        });
+
+    } catch (err) {
+        document.getElementById('results').style.display = 'none';
+        showError('Search failed: ' + err.message);
+    } finally {
+        searchBtn.disabled = false;
+        searchBtn.innerHTML = 'Search';
+    }
+}
+
+// Parse a text/event-stream body and call onEvent(name, data) for each event
+async function readEvents(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let event = 'message';
+            let payload = '';
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) payload += line.slice(6);
+            });
+            onEvent(event, JSON.parse(payload));
+        }
+    }
+}
+
+function displayJira(jira) {
+    document.getElementById('jiraCount').textContent = jira.length;
+
+    // Display Jira results
+    let jiraHtml = '';
+    if (jira && jira.length > 0) {
+        jira.forEach(issue => {
+            // Use extracted description text if available
+            let descText = issue.fields.description_text || 'No description';
+
+            if (descText && descText.length > 200) {
+                descText = descText.substring(0, 200) + '...';
+            }
+
+            jiraHtml += `
+                <div class="result-item">
+                    <div class="result-title">${issue.key}: ${issue.fields.summary || 'No summary'}</div>
+                    <div class="result-description">${descText}</div>
+                    <div class="result-meta">
+                        Status: ${issue.fields.status ? issue.fields.status.name : 'Unknown'} | 
+                        Type: ${issue.fields.issuetype ? issue.fields.issuetype.name : 'Unknown'}
+                    </div>
+                </div>
+            `;
+        });
+    } else {
+        jiraHtml = '<p>No Jira tickets found</p>';
+    }
+
+    document.getElementById('jiraResults').innerHTML = jiraHtml;
+    document.getElementById('results').style.display = 'block';
+}
+
+function displayConfluence(confluence) {
+    document.getElementById('confluenceCount').textContent = confluence.length;
+
+    // Display Confluence results
+    const query = document.getElementById('searchQuery').value.toLowerCase();
+    let confluenceHtml = '';
+
+    if (confluence && confluence.length > 0) {
+        confluence.forEach(page => {
+            const title = page.title.toLowerCase();
+            let badge = '';
+
+            if (title === query) {
+                badge = '<span class="badge">EXACT MATCH</span>';
+            } else if (title.includes(query)) {
+                badge = '<span class="badge badge-high">HIGH RELEVANCE</span>';
+            }
+
+            confluenceHtml += `
+                <div class="result-item">
+                    <div class="result-title">${page.title}${badge}</div>
+                    <div class="result-meta">Type: ${page.type}</div>
+                </div>
+            `;
+        });
+    } else {
+        confluenceHtml = '<p>No Confluence pages found</p>';
+    }
+
+    document.getElementById('confluenceResults').innerHTML = confluenceHtml;
+    document.getElementById('results').style.display = 'block';
+}
+
+// The prompt is built server-side so it stays within the model's context budget
+async function generateSummary(query, data) {
+    const summaryText = document.getElementById('summaryText');
+    summaryText.value = 'Building summary...';
+    try {
+        const response = await fetch('/summary', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({ query, jira: data.jira, confluence: data.confluence })
+        });
+        const result = await response.json();
+        if (!response.ok) {
+            throw new Error(result.error || 'Summary failed');
+        }
+        summaryText.value = result.summary;
+    } catch (err) {
+        summaryText.value = '';
+        showError('Could not build summary: ' + err.message);
+    }
+}
+
+function copySummary() {
+    const text = document.getElementById('summaryText').value;
+    navigator.clipboard.writeText(text).then(() => {
+        showSuccess('✅ Summary copied! Now paste it in your Claude chat to generate test cases.');
+    }).catch(() => {
+        showError('Failed to copy. Please select and copy manually.');
+    });
+}
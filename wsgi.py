@@ -0,0 +1,28 @@
+"""
+WSGI entry point for production servers
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app lives in python-atlassian-search.py, whose hyphen makes it unimportable by
+name, so it is loaded from its path and registered as `atlassian_search`.
+"""
+
+import importlib.util
+import os
+import sys
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(APP_DIR, 'python-atlassian-search.py')
+
+def load_app_module():
+    # The app imports its sibling modules (adf, ranking, ...) by name
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+    spec = importlib.util.spec_from_file_location('atlassian_search', APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['atlassian_search'] = module
+    spec.loader.exec_module(module)
+    return module
+
+atlassian_search = load_app_module()
+app = atlassian_search.app